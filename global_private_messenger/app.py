@@ -1,638 +1,1829 @@
-"""
-Web Messenger Application - Complete Implementation
-A Telegram-like web messenger with Flask, SQLAlchemy, and WebSocket support
-"""
-
-import os
-import json
-import sqlite3
-from datetime import datetime
-from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-import jwt
-from flask import Flask, render_template, request, jsonify, send_from_directory, session
-from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
-import secrets
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///messenger.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
-
-# Create upload folder
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Initialize extensions
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
-socketio = SocketIO(app, cors_allowed_origins="*")
-CORS(app)
-
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar', 'mp3', 'mp4', 'avi', 'mov'}
-
-# Models
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False, index=True)
-    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
-    password_hash = db.Column(db.String(255), nullable=False)
-    display_name = db.Column(db.String(120), default='')
-    bio = db.Column(db.String(500), default='')
-    avatar = db.Column(db.String(255), default='')
-    status = db.Column(db.String(50), default='offline')  # online, offline, away
-    is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_seen = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    messages = db.relationship('Message', foreign_keys='Message.sender_id', backref='sender', lazy='dynamic')
-    conversations = db.relationship('Conversation', secondary='conversation_users', backref=db.backref('members', lazy='dynamic'))
-    contacts = db.relationship('Contact', foreign_keys='Contact.user_id', backref='user', lazy='dynamic')
-    
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-    
-    def to_dict(self, include_email=False):
-        data = {
-            'id': self.id,
-            'username': self.username,
-            'display_name': self.display_name,
-            'bio': self.bio,
-            'avatar': self.avatar,
-            'status': self.status,
-            'last_seen': self.last_seen.isoformat()
-        }
-        if include_email:
-            data['email'] = self.email
-        return data
-
-class Conversation(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(200))
-    description = db.Column(db.String(500))
-    is_group = db.Column(db.Boolean, default=False)
-    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    icon = db.Column(db.String(255))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    messages = db.relationship('Message', backref='conversation', lazy='dynamic', cascade='all, delete-orphan')
-    creator = db.relationship('User', foreign_keys=[creator_id], backref='created_conversations')
-    
-    def to_dict(self, include_messages=False):
-        data = {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'is_group': self.is_group,
-            'creator_id': self.creator_id,
-            'icon': self.icon,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'members_count': len(self.members.all()),
-            'members': [member.to_dict() for member in self.members.all()]
-        }
-        if include_messages:
-            data['messages'] = [msg.to_dict() for msg in self.messages.order_by(Message.created_at).all()]
-        return data
-
-class Message(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    content = db.Column(db.Text)
-    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
-    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False, index=True)
-    message_type = db.Column(db.String(50), default='text')  # text, image, file, video, audio
-    file_url = db.Column(db.String(255))
-    file_name = db.Column(db.String(255))
-    file_size = db.Column(db.Integer)
-    is_edited = db.Column(db.Boolean, default=False)
-    is_deleted = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
-    edited_at = db.Column(db.DateTime)
-    
-    reactions = db.relationship('Reaction', backref='message', lazy='dynamic', cascade='all, delete-orphan')
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'content': self.content,
-            'sender': self.sender.to_dict(),
-            'conversation_id': self.conversation_id,
-            'message_type': self.message_type,
-            'file_url': self.file_url,
-            'file_name': self.file_name,
-            'file_size': self.file_size,
-            'is_edited': self.is_edited,
-            'is_deleted': self.is_deleted,
-            'created_at': self.created_at.isoformat(),
-            'edited_at': self.edited_at.isoformat() if self.edited_at else None,
-            'reactions': {r.emoji: r.count for r in self.reactions.all()}
-        }
-
-class Contact(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    contact_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
-    contact_name = db.Column(db.String(120), default='')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    contact = db.relationship('User', foreign_keys=[contact_id], backref='contacts_with_me')
-
-class Reaction(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    message_id = db.Column(db.Integer, db.ForeignKey('message.id'), nullable=False)
-    emoji = db.Column(db.String(10), nullable=False)
-    count = db.Column(db.Integer, default=1)
-
-# Association table for conversation members
-conversation_users = db.Table('conversation_users',
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('conversation_id', db.Integer, db.ForeignKey('conversation.id'), primary_key=True)
-)
-
-# Login Manager
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# Utility Functions
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def get_jwt_token(user_id):
-    return jwt.encode({'user_id': user_id, 'exp': datetime.utcnow().timestamp() + 86400}, 
-                     app.config['SECRET_KEY'], algorithm='HS256')
-
-# Routes - Authentication
-@app.route('/api/auth/register', methods=['POST'])
-def register():
-    data = request.get_json()
-    
-    if not data or not all(k in data for k in ['username', 'email', 'password']):
-        return jsonify({'error': 'Missing required fields'}), 400
-    
-    if User.query.filter_by(username=data['username']).first():
-        return jsonify({'error': 'Username already exists'}), 409
-    
-    if User.query.filter_by(email=data['email']).first():
-        return jsonify({'error': 'Email already exists'}), 409
-    
-    user = User(
-        username=data['username'],
-        email=data['email'],
-        display_name=data.get('display_name', data['username'])
-    )
-    user.set_password(data['password'])
-    
-    db.session.add(user)
-    db.session.commit()
-    
-    login_user(user)
-    return jsonify({
-        'message': 'Registration successful',
-        'user': user.to_dict(include_email=True),
-        'token': get_jwt_token(user.id)
-    }), 201
-
-@app.route('/api/auth/login', methods=['POST'])
-def login():
-    data = request.get_json()
-    
-    if not data or not all(k in data for k in ['username', 'password']):
-        return jsonify({'error': 'Missing required fields'}), 400
-    
-    user = User.query.filter_by(username=data['username']).first()
-    
-    if not user or not user.check_password(data['password']):
-        return jsonify({'error': 'Invalid credentials'}), 401
-    
-    login_user(user)
-    return jsonify({
-        'message': 'Login successful',
-        'user': user.to_dict(include_email=True),
-        'token': get_jwt_token(user.id)
-    }), 200
-
-@app.route('/api/auth/logout', methods=['POST'])
-@login_required
-def logout():
-    logout_user()
-    return jsonify({'message': 'Logout successful'}), 200
-
-@app.route('/api/auth/me', methods=['GET'])
-@login_required
-def get_current_user():
-    return jsonify(current_user.to_dict(include_email=True)), 200
-
-# Routes - Users
-@app.route('/api/users/<username>', methods=['GET'])
-def get_user(username):
-    user = User.query.filter_by(username=username).first()
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    return jsonify(user.to_dict()), 200
-
-@app.route('/api/users/search/<query>', methods=['GET'])
-@login_required
-def search_users(query):
-    users = User.query.filter(
-        (User.username.ilike(f'%{query}%')) | 
-        (User.display_name.ilike(f'%{query}%'))
-    ).limit(20).all()
-    return jsonify([user.to_dict() for user in users]), 200
-
-@app.route('/api/users/<user_id>/profile', methods=['PUT'])
-@login_required
-def update_profile(user_id):
-    if current_user.id != int(user_id):
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    data = request.get_json()
-    
-    current_user.display_name = data.get('display_name', current_user.display_name)
-    current_user.bio = data.get('bio', current_user.bio)
-    current_user.status = data.get('status', current_user.status)
-    
-    db.session.commit()
-    return jsonify(current_user.to_dict(include_email=True)), 200
-
-@app.route('/api/users/<user_id>/avatar', methods=['POST'])
-@login_required
-def upload_avatar(user_id):
-    if current_user.id != int(user_id):
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-    
-    if file and allowed_file(file.filename):
-        filename = f"avatar_{user_id}_{secrets.token_hex(8)}.{file.filename.rsplit('.', 1)[1].lower()}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        current_user.avatar = f'/uploads/{filename}'
-        db.session.commit()
-        return jsonify({'avatar_url': current_user.avatar}), 200
-    
-    return jsonify({'error': 'Invalid file type'}), 400
-
-# Routes - Conversations
-@app.route('/api/conversations', methods=['GET'])
-@login_required
-def get_conversations():
-    conversations = current_user.conversations.all()
-    return jsonify([conv.to_dict() for conv in conversations]), 200
-
-@app.route('/api/conversations', methods=['POST'])
-@login_required
-def create_conversation():
-    data = request.get_json()
-    
-    if not data or 'title' not in data:
-        return jsonify({'error': 'Title is required'}), 400
-    
-    conversation = Conversation(
-        title=data['title'],
-        description=data.get('description', ''),
-        is_group=data.get('is_group', False),
-        creator_id=current_user.id
-    )
-    
-    db.session.add(conversation)
-    db.session.flush()
-    
-    conversation.members.append(current_user)
-    
-    if 'members' in data:
-        for member_id in data['members']:
-            member = User.query.get(member_id)
-            if member:
-                conversation.members.append(member)
-    
-    db.session.commit()
-    return jsonify(conversation.to_dict()), 201
-
-@app.route('/api/conversations/<conv_id>', methods=['GET'])
-@login_required
-def get_conversation(conv_id):
-    conversation = Conversation.query.get(conv_id)
-    if not conversation or current_user not in conversation.members.all():
-        return jsonify({'error': 'Conversation not found'}), 404
-    
-    return jsonify(conversation.to_dict(include_messages=True)), 200
-
-@app.route('/api/conversations/<conv_id>', methods=['PUT'])
-@login_required
-def update_conversation(conv_id):
-    conversation = Conversation.query.get(conv_id)
-    if not conversation or conversation.creator_id != current_user.id:
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    data = request.get_json()
-    conversation.title = data.get('title', conversation.title)
-    conversation.description = data.get('description', conversation.description)
-    conversation.updated_at = datetime.utcnow()
-    
-    db.session.commit()
-    return jsonify(conversation.to_dict()), 200
-
-@app.route('/api/conversations/<conv_id>/members', methods=['POST'])
-@login_required
-def add_member(conv_id):
-    conversation = Conversation.query.get(conv_id)
-    if not conversation or current_user not in conversation.members.all():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    data = request.get_json()
-    user = User.query.get(data.get('user_id'))
-    
-    if user and user not in conversation.members.all():
-        conversation.members.append(user)
-        db.session.commit()
-        return jsonify(conversation.to_dict()), 200
-    
-    return jsonify({'error': 'User not found or already member'}), 400
-
-@app.route('/api/conversations/<conv_id>/members/<member_id>', methods=['DELETE'])
-@login_required
-def remove_member(conv_id, member_id):
-    conversation = Conversation.query.get(conv_id)
-    if not conversation or (conversation.creator_id != current_user.id and int(member_id) != current_user.id):
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    member = User.query.get(member_id)
-    if member in conversation.members.all():
-        conversation.members.remove(member)
-        db.session.commit()
-        return jsonify({'message': 'Member removed'}), 200
-    
-    return jsonify({'error': 'Member not found'}), 404
-
-# Routes - Messages
-@app.route('/api/conversations/<conv_id>/messages', methods=['GET'])
-@login_required
-def get_messages(conv_id):
-    conversation = Conversation.query.get(conv_id)
-    if not conversation or current_user not in conversation.members.all():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 50, type=int)
-    
-    messages = conversation.messages.order_by(Message.created_at.desc()).paginate(page=page, per_page=per_page)
-    
-    return jsonify({
-        'messages': [msg.to_dict() for msg in reversed(messages.items)],
-        'total': messages.total,
-        'pages': messages.pages,
-        'current_page': page
-    }), 200
-
-@app.route('/api/conversations/<conv_id>/messages', methods=['POST'])
-@login_required
-def send_message(conv_id):
-    conversation = Conversation.query.get(conv_id)
-    if not conversation or current_user not in conversation.members.all():
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    data = request.get_json()
-    
-    if not data or 'content' not in data:
-        return jsonify({'error': 'Content is required'}), 400
-    
-    message = Message(
-        content=data['content'],
-        sender_id=current_user.id,
-        conversation_id=conv_id,
-        message_type=data.get('message_type', 'text')
-    )
-    
-    db.session.add(message)
-    db.session.commit()
-    
-    socketio.emit('new_message', message.to_dict(), room=f'conv_{conv_id}')
-    
-    return jsonify(message.to_dict()), 201
-
-@app.route('/api/messages/<msg_id>/file', methods=['POST'])
-@login_required
-def upload_file(msg_id):
-    message = Message.query.get(msg_id)
-    if not message or message.sender_id != current_user.id:
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
-    if file and allowed_file(file.filename):
-        filename = f"{msg_id}_{secrets.token_hex(8)}_{secure_filename(file.filename)}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        message.file_url = f'/uploads/{filename}'
-        message.file_name = file.filename
-        message.file_size = os.path.getsize(filepath)
-        message.message_type = 'file'
-        
-        db.session.commit()
-        return jsonify(message.to_dict()), 200
-    
-    return jsonify({'error': 'Invalid file type'}), 400
-
-@app.route('/api/messages/<msg_id>', methods=['PUT'])
-@login_required
-def edit_message(msg_id):
-    message = Message.query.get(msg_id)
-    if not message or message.sender_id != current_user.id:
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    data = request.get_json()
-    message.content = data.get('content', message.content)
-    message.is_edited = True
-    message.edited_at = datetime.utcnow()
-    
-    db.session.commit()
-    
-    socketio.emit('message_edited', message.to_dict(), room=f'conv_{message.conversation_id}')
-    
-    return jsonify(message.to_dict()), 200
-
-@app.route('/api/messages/<msg_id>', methods=['DELETE'])
-@login_required
-def delete_message(msg_id):
-    message = Message.query.get(msg_id)
-    if not message or message.sender_id != current_user.id:
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    message.is_deleted = True
-    message.content = ''
-    
-    db.session.commit()
-    
-    socketio.emit('message_deleted', {'message_id': msg_id}, room=f'conv_{message.conversation_id}')
-    
-    return jsonify({'message': 'Message deleted'}), 200
-
-@app.route('/api/messages/<msg_id>/react', methods=['POST'])
-@login_required
-def add_reaction(msg_id):
-    message = Message.query.get(msg_id)
-    if not message:
-        return jsonify({'error': 'Message not found'}), 404
-    
-    data = request.get_json()
-    emoji = data.get('emoji')
-    
-    reaction = Reaction.query.filter_by(message_id=msg_id, emoji=emoji).first()
-    if reaction:
-        reaction.count += 1
-    else:
-        reaction = Reaction(message_id=msg_id, emoji=emoji, count=1)
-        db.session.add(reaction)
-    
-    db.session.commit()
-    
-    socketio.emit('message_reacted', message.to_dict(), room=f'conv_{message.conversation_id}')
-    
-    return jsonify(message.to_dict()), 200
-
-# Routes - File serving
-@app.route('/uploads/<filename>', methods=['GET'])
-def download_file(filename):
-    try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-    except:
-        return jsonify({'error': 'File not found'}), 404
-
-# Routes - Contacts
-@app.route('/api/contacts', methods=['GET'])
-@login_required
-def get_contacts():
-    contacts = Contact.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{
-        'id': c.contact_id,
-        'name': c.contact_name,
-        'user': c.contact.to_dict()
-    } for c in contacts]), 200
-
-@app.route('/api/contacts', methods=['POST'])
-@login_required
-def add_contact():
-    data = request.get_json()
-    contact_id = data.get('contact_id')
-    
-    if not contact_id or User.query.get(contact_id) is None:
-        return jsonify({'error': 'Invalid contact'}), 400
-    
-    contact = Contact(
-        user_id=current_user.id,
-        contact_id=contact_id,
-        contact_name=data.get('contact_name', '')
-    )
-    
-    db.session.add(contact)
-    db.session.commit()
-    
-    return jsonify({'message': 'Contact added'}), 201
-
-@app.route('/api/contacts/<contact_id>', methods=['DELETE'])
-@login_required
-def delete_contact(contact_id):
-    contact = Contact.query.filter_by(user_id=current_user.id, contact_id=contact_id).first()
-    if not contact:
-        return jsonify({'error': 'Contact not found'}), 404
-    
-    db.session.delete(contact)
-    db.session.commit()
-    
-    return jsonify({'message': 'Contact deleted'}), 200
-
-# WebSocket Events
-@socketio.on('connect')
-def handle_connect():
-    if current_user.is_authenticated:
-        current_user.status = 'online'
-        current_user.last_seen = datetime.utcnow()
-        db.session.commit()
-        emit('status_changed', {'user_id': current_user.id, 'status': 'online'}, broadcast=True)
-
-@socketio.on('disconnect')
-def handle_disconnect():
-    if current_user.is_authenticated:
-        current_user.status = 'offline'
-        current_user.last_seen = datetime.utcnow()
-        db.session.commit()
-        emit('status_changed', {'user_id': current_user.id, 'status': 'offline'}, broadcast=True)
-
-@socketio.on('join_conversation')
-def on_join(data):
-    if current_user.is_authenticated:
-        conv_id = data.get('conversation_id')
-        room = f'conv_{conv_id}'
-        join_room(room)
-        emit('user_joined', {'user': current_user.to_dict()}, room=room)
-
-@socketio.on('leave_conversation')
-def on_leave(data):
-    if current_user.is_authenticated:
-        conv_id = data.get('conversation_id')
-        room = f'conv_{conv_id}'
-        leave_room(room)
-        emit('user_left', {'user_id': current_user.id}, room=room)
-
-@socketio.on('typing')
-def handle_typing(data):
-    if current_user.is_authenticated:
-        conv_id = data.get('conversation_id')
-        room = f'conv_{conv_id}'
-        emit('user_typing', {
-            'user_id': current_user.id,
-            'username': current_user.username
-        }, room=room, skip_sid=True)
-
-@socketio.on('stop_typing')
-def handle_stop_typing(data):
-    if current_user.is_authenticated:
-        conv_id = data.get('conversation_id')
-        room = f'conv_{conv_id}'
-        emit('user_stop_typing', {
-            'user_id': current_user.id
-        }, room=room, skip_sid=True)
-
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({'error': 'Not found'}), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    db.session.rollback()
-    return jsonify({'error': 'Internal server error'}), 500
-
-# Frontend routes
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/chat/<conv_id>')
-def chat(conv_id):
-    return render_template('chat.html', conversation_id=conv_id)
-
-if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
+"""
+Web Messenger Application - Complete Implementation
+A Telegram-like web messenger with Flask, SQLAlchemy, and WebSocket support
+"""
+
+import os
+import json
+import hmac
+import base64
+import hashlib
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps, partial
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename, safe_join, send_file as send_file_response
+from werkzeug.http import parse_content_range_header
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import jwt
+from flask import Flask, render_template, request, jsonify, session, g, has_app_context
+from flask_cors import CORS
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
+import secrets
+import click
+from cache import TTLCache
+from socket_queue import queue_options
+from presence import PresenceTracker
+from typing_indicators import TypingAggregator
+from search import MessageSearch
+from user_index import UserSearchIndex
+from uploads import ChunkedUploadStore, UploadError, save_stream
+from blobstore import BlobStore, DIGEST_RE
+from media import MediaPipeline, is_image, media_key
+from ingest import GroupCommitWriter
+from sqlite_tuning import configure_sqlite, install_pragmas
+from fanout import FanOut
+from metrics import Metrics
+from async_mode import is_green, is_patched, native_runner
+from config import config
+
+app = Flask(__name__)
+app_config = config.get(os.environ.get('FLASK_ENV', 'default'), config['default'])
+app.config.from_object(app_config)
+app_config.init_app(app)
+
+# Green threads only work when the standard library was patched before anything imported it
+async_mode = app.config['SOCKETIO_ASYNC_MODE']
+if is_green(async_mode) and not is_patched(async_mode):
+    raise RuntimeError(f'SOCKETIO_ASYNC_MODE={async_mode} needs monkey patching first, start the server through wsgi.py')
+
+# Create upload folder
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+# Initialize extensions
+db = SQLAlchemy(app, session_options=configure_sqlite(app))
+install_pragmas(app, db)
+login_manager = LoginManager(app)
+login_manager.login_view = 'login'
+socketio = SocketIO(app, async_mode=async_mode, cors_allowed_origins="*", **queue_options(app.config['SOCKETIO_MESSAGE_QUEUE']))
+CORS(app)
+
+# Request, Socket.IO event and SQL instrumentation behind /metrics
+metrics = Metrics(app.logger, slow_threshold=app.config['METRICS_SLOW_REQUEST_MS'] / 1000)
+if app.config['METRICS_ENABLED']:
+    metrics.instrument_app(app)
+    metrics.instrument_engines(app, db)
+    metrics.instrument_socketio(socketio)
+
+# Positive membership lookups, keyed by (conversation_id, user_id)
+membership_cache = TTLCache(maxsize=app.config['MEMBERSHIP_CACHE_SIZE'], ttl=app.config['MEMBERSHIP_CACHE_TTL'])
+
+# Serialized public user profiles, keyed by user id
+profile_cache = TTLCache(maxsize=app.config['PROFILE_CACHE_SIZE'], ttl=app.config['PROFILE_CACHE_TTL'])
+
+# Detached User instances for load_user, keyed by user id
+user_cache = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+# new_message delivery to every member's personal room
+fanout = FanOut(socketio, chunk_size=app.config['FANOUT_CHUNK_SIZE'])
+
+# Socket connections per user, with debounced offline transitions
+presence = PresenceTracker(grace_period=app.config['PRESENCE_GRACE_PERIOD'])
+
+# Full-text message search (FTS5 on SQLite, tsvector on PostgreSQL)
+message_search = MessageSearch(db)
+
+# Deduplicated upload storage under UPLOAD_FOLDER/blobs
+blob_store = BlobStore(app.config['UPLOAD_FOLDER'])
+
+# Image thumbnails and avatar variants under UPLOAD_FOLDER/variants
+# (in green modes resizing runs on the native thread pool and the callbacks in green tasks)
+media = MediaPipeline(
+    app.config['UPLOAD_FOLDER'],
+    workers=app.config['MEDIA_WORKERS'],
+    spawn=socketio.start_background_task if is_green(async_mode) else None,
+    run_native=native_runner(async_mode)
+)
+
+# Group commit for send_message, enabled with INGEST_GROUP_COMMIT (the lambda
+# defers the lookup of commit_message_batch, which is defined with the helpers)
+ingest_writer = GroupCommitWriter(
+    lambda batch: commit_message_batch(batch),
+    max_batch=app.config['INGEST_MAX_BATCH'],
+    max_delay=app.config['INGEST_MAX_DELAY']
+)
+
+# Resumable chunked uploads, assembled under UPLOAD_FOLDER/.partial
+chunked_uploads = ChunkedUploadStore(app.config['UPLOAD_FOLDER'], max_size=app.config['UPLOAD_MAX_SIZE'])
+
+# Prefix/trigram index behind search_users
+user_index = UserSearchIndex()
+_user_index_lock = threading.Lock()
+_user_index_synced_at = 0.0
+
+# Typing users per conversation, broadcast as coalesced typing_state events
+typing_state = TypingAggregator(ttl=app.config['TYPING_TTL'], min_interval=app.config['TYPING_MIN_INTERVAL'])
+
+# Background tasks started by this process, by name
+_background_tasks = {}
+_background_lock = threading.Lock()
+
+# Allowed file extensions
+ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar', 'mp3', 'mp4', 'avi', 'mov'}
+
+# Models
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False, index=True)
+    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    password_hash = db.Column(db.String(255), nullable=False)
+    display_name = db.Column(db.String(120), default='')
+    bio = db.Column(db.String(500), default='')
+    avatar = db.Column(db.String(255), default='')
+    status = db.Column(db.String(50), default='offline')  # online, offline, away
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    messages = db.relationship('Message', foreign_keys='Message.sender_id', backref='sender', lazy='dynamic')
+    conversations = db.relationship('Conversation', secondary='conversation_users', backref=db.backref('members', lazy='dynamic'))
+    contacts = db.relationship('Contact', foreign_keys='Contact.user_id', backref='user', lazy='dynamic')
+    
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+    
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+    
+    def to_dict(self, include_email=False):
+        data = {
+            'id': self.id,
+            'username': self.username,
+            'display_name': self.display_name,
+            'bio': self.bio,
+            'avatar': self.avatar,
+            'status': self.status,
+            'last_seen': self.last_seen.isoformat()
+        }
+        if include_email:
+            data['email'] = self.email
+        return data
+
+class Conversation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200))
+    description = db.Column(db.String(500))
+    is_group = db.Column(db.Boolean, default=False)
+    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    icon = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_message_id = db.Column(db.Integer)  # latest message that is not deleted
+    message_count = db.Column(db.Integer, default=0, nullable=False)  # messages that are not deleted
+    
+    messages = db.relationship('Message', backref='conversation', lazy='dynamic', cascade='all, delete-orphan')
+    creator = db.relationship('User', foreign_keys=[creator_id], backref='created_conversations')
+    
+    def to_dict(self, include_messages=False, members=None):
+        if members is None:
+            member_ids = get_member_ids(self.id)
+            profiles = get_profiles(member_ids)
+            members = [profiles[user_id] for user_id in member_ids if user_id in profiles]
+        data = {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'is_group': self.is_group,
+            'creator_id': self.creator_id,
+            'icon': self.icon,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+            'last_message_id': self.last_message_id,
+            'message_count': self.message_count,
+            'members_count': len(members),
+            'members': members
+        }
+        if include_messages:
+            data['messages'] = serialize_messages(self.messages.order_by(Message.created_at).all())
+        return data
+
+class Message(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    content = db.Column(db.Text)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False, index=True)
+    message_type = db.Column(db.String(50), default='text')  # text, image, file, video, audio
+    file_url = db.Column(db.String(255))
+    file_name = db.Column(db.String(255))
+    file_size = db.Column(db.Integer)
+    width = db.Column(db.Integer)  # image dimensions, filled in by the media pipeline
+    height = db.Column(db.Integer)
+    thumbnail_url = db.Column(db.String(255))
+    is_edited = db.Column(db.Boolean, default=False)
+    is_deleted = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    edited_at = db.Column(db.DateTime)
+    
+    reactions = db.relationship('Reaction', backref='message', lazy='dynamic', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_message_conversation_created', 'conversation_id', 'created_at', 'id'),
+    )
+    
+    def to_dict(self, reactions=None):
+        if reactions is None:
+            reactions = {r.emoji: r.count for r in self.reactions.all()}
+        return {
+            'id': self.id,
+            'content': self.content,
+            'sender': get_profile(self.sender_id),
+            'conversation_id': self.conversation_id,
+            'message_type': self.message_type,
+            'file_url': self.file_url,
+            'file_name': self.file_name,
+            'file_size': self.file_size,
+            'width': self.width,
+            'height': self.height,
+            'thumbnail_url': self.thumbnail_url,
+            'is_edited': self.is_edited,
+            'is_deleted': self.is_deleted,
+            'created_at': self.created_at.isoformat(),
+            'edited_at': self.edited_at.isoformat() if self.edited_at else None,
+            'reactions': reactions
+        }
+
+class Contact(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    contact_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    contact_name = db.Column(db.String(120), default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    contact = db.relationship('User', foreign_keys=[contact_id], backref='contacts_with_me')
+
+class Reaction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.Integer, db.ForeignKey('message.id'), nullable=False)
+    emoji = db.Column(db.String(10), nullable=False)
+    count = db.Column(db.Integer, default=1)
+    
+    __table_args__ = (
+        db.UniqueConstraint('message_id', 'emoji', name='uq_reaction_message_emoji'),
+    )
+
+class Blob(db.Model):
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)  # messages whose file_url points here
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    released_at = db.Column(db.DateTime)  # when ref_count last dropped to zero
+
+# pg_advisory_xact_lock key that serializes change log writes until their commit
+CHANGE_LOG_LOCK = 0x6d736773
+
+class ChangeLog(db.Model):
+    """Ordered record of changes, read back by /api/sync after a reconnect"""
+    seq = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)  # message, message_edited, message_deleted, reaction, conversation, member_added, member_removed
+    conversation_id = db.Column(db.Integer, nullable=False)
+    message_id = db.Column(db.Integer)
+    user_id = db.Column(db.Integer)  # member affected by membership changes
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_change_log_conversation_seq', 'conversation_id', 'seq'),
+        db.Index('ix_change_log_user_seq', 'user_id', 'seq'),
+        {'sqlite_autoincrement': True}  # never reuse a sequence number after compaction
+    )
+
+# Association table for conversation members
+conversation_users = db.Table('conversation_users',
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Column('conversation_id', db.Integer, db.ForeignKey('conversation.id'), primary_key=True),
+    db.Column('last_read_message_id', db.Integer, default=0, nullable=False),  # read cursor
+    db.Column('read_count', db.Integer, default=0, nullable=False)  # messages up to the cursor; unread is message_count - read_count
+)
+
+# Login Manager
+@login_manager.user_loader
+def load_user(user_id):
+    user_id = int(user_id)
+    user = user_cache.get(user_id)
+    if user is None:
+        # Load outside the request session so the cached copy stays detached and unchanged
+        with Session(db.engine, expire_on_commit=False) as loader:
+            user = loader.get(User, user_id)
+            if user is None:
+                return None
+            loader.expunge(user)
+        user_cache.set(user_id, user)
+    return db.session.merge(user, load=False)
+
+# Utility Functions
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def get_jwt_token(user_id):
+    return jwt.encode({'user_id': user_id, 'exp': datetime.utcnow().timestamp() + 86400}, 
+                     app.config['SECRET_KEY'], algorithm='HS256')
+
+def get_profiles(user_ids):
+    """Serialized profiles from the request and process caches, loading misses in bulk"""
+    request_profiles = g.setdefault('profiles', {}) if has_app_context() else {}
+    profiles = {}
+    missing = []
+    for user_id in set(user_ids):
+        profile = request_profiles.get(user_id) or profile_cache.get(user_id)
+        if profile is None:
+            missing.append(user_id)
+        else:
+            profiles[user_id] = profile
+    
+    for offset in range(0, len(missing), 500):
+        for user in User.query.filter(User.id.in_(missing[offset:offset + 500])):
+            profiles[user.id] = user.to_dict()
+            profile_cache.set(user.id, profiles[user.id])
+    
+    request_profiles.update(profiles)
+    return profiles
+
+def get_profile(user_id):
+    return get_profiles([user_id]).get(user_id)
+
+def invalidate_user(user_id):
+    """Drop a user's cached identity and serialized profile after a change"""
+    user_cache.delete(user_id)
+    profile_cache.delete(user_id)
+    if has_app_context():
+        g.get('profiles', {}).pop(user_id, None)
+
+def get_member_ids(conv_id, limit=None):
+    query = db.session.query(conversation_users.c.user_id).filter(
+        conversation_users.c.conversation_id == conv_id
+    ).order_by(conversation_users.c.user_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return [user_id for (user_id,) in query]
+
+def is_member(conv_id, user_id):
+    """Primary-key EXISTS lookup on conversation_users, cached per process"""
+    key = (int(conv_id), int(user_id))
+    if membership_cache.get(key):
+        return True
+    
+    exists = db.session.query(db.exists().where(
+        conversation_users.c.conversation_id == key[0],
+        conversation_users.c.user_id == key[1]
+    )).scalar()
+    # Only memberships are cached, so a user added on another worker is never refused
+    if exists:
+        membership_cache.set(key, True)
+    return exists
+
+def invalidate_membership(conv_id, user_ids):
+    for user_id in user_ids:
+        membership_cache.delete((int(conv_id), int(user_id)))
+
+def encode_cursor(message):
+    raw = f'{message.created_at.isoformat()}|{message.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, conv_id):
+    """Return the (created_at, id) position of a cursor or a plain message id"""
+    if cursor.isdigit():
+        position = db.session.query(Message.created_at, Message.id).filter_by(
+            id=int(cursor), conversation_id=conv_id
+        ).first()
+        if position is None:
+            raise ValueError('Unknown message id')
+        return tuple(position)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, msg_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(msg_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Malformed cursor') from e
+
+def paginate_messages(conv_id, before=None, after=None, limit=50):
+    """Keyset pagination over (conversation_id, created_at, id)
+
+    Returns the page in chronological order and whether more messages exist
+    in the requested direction. Without a cursor the latest page is returned.
+    """
+    query = Message.query.filter(Message.conversation_id == conv_id)
+    if after is not None:
+        created_at, msg_id = decode_cursor(after, conv_id)
+        query = query.filter(
+            Message.created_at >= created_at,
+            db.or_(Message.created_at > created_at,
+                   db.and_(Message.created_at == created_at, Message.id > msg_id))
+        ).order_by(Message.created_at.asc(), Message.id.asc())
+    else:
+        if before is not None:
+            created_at, msg_id = decode_cursor(before, conv_id)
+            query = query.filter(
+                Message.created_at <= created_at,
+                db.or_(Message.created_at < created_at,
+                       db.and_(Message.created_at == created_at, Message.id < msg_id))
+            )
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+    
+    messages = query.limit(limit + 1).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if after is None:
+        messages.reverse()
+    return messages, has_more
+
+def conversation_snapshot(conversation, message_limit):
+    """Conversation metadata with a bounded member summary and the latest messages"""
+    member_ids = get_member_ids(conversation.id, limit=app.config['SNAPSHOT_MEMBER_LIMIT'])
+    profiles = get_profiles(member_ids)
+    members = [profiles[user_id] for user_id in member_ids if user_id in profiles]
+    members_count = db.session.query(db.func.count()).select_from(conversation_users).filter(
+        conversation_users.c.conversation_id == conversation.id
+    ).scalar()
+    messages, has_more = paginate_messages(conversation.id, limit=message_limit)
+    
+    data = conversation.to_dict(members=members)
+    data['members_count'] = members_count
+    data['members_truncated'] = members_count > len(members)
+    data['messages'] = serialize_messages(messages)
+    data['next_cursor'] = encode_cursor(messages[0]) if has_more and messages else None
+    return data
+
+def load_reactions(message_ids):
+    """Reaction counters for a page of messages in one grouped query"""
+    reactions = {msg_id: {} for msg_id in message_ids}
+    if reactions:
+        rows = db.session.query(Reaction.message_id, Reaction.emoji, Reaction.count).filter(
+            Reaction.message_id.in_(list(reactions))
+        ).all()
+        for msg_id, emoji, count in rows:
+            reactions[msg_id][emoji] = count
+    return reactions
+
+def serialize_messages(messages):
+    get_profiles([msg.sender_id for msg in messages])
+    reactions = load_reactions([msg.id for msg in messages])
+    return [msg.to_dict(reactions=reactions[msg.id]) for msg in messages]
+
+def increment_reaction(message_id, emoji):
+    """Atomically add one to a reaction counter, creating the row on first use"""
+    increment = db.update(Reaction).where(
+        Reaction.message_id == message_id, Reaction.emoji == emoji
+    ).values(count=Reaction.count + 1)
+    
+    if db.session.execute(increment).rowcount == 0:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(Reaction).values(message_id=message_id, emoji=emoji, count=1))
+        except IntegrityError:
+            # Another request inserted the first reaction in the meantime
+            db.session.execute(increment)
+    
+    return db.session.query(Reaction.count).filter_by(message_id=message_id, emoji=emoji).scalar()
+
+def member_conversations(user_id, conv_ids=None):
+    """A user's conversations, most recent first, with their (last_read_message_id, unread_count)"""
+    query = db.session.query(
+        Conversation, conversation_users.c.last_read_message_id, conversation_users.c.read_count
+    ).join(
+        conversation_users, conversation_users.c.conversation_id == Conversation.id
+    ).filter(conversation_users.c.user_id == user_id)
+    if conv_ids is not None:
+        query = query.filter(Conversation.id.in_(list(conv_ids)))
+    rows = query.order_by(Conversation.updated_at.desc()).all()
+    return [conv for conv, _, _ in rows], {
+        conv.id: (last_read, max(conv.message_count - read_count, 0)) for conv, last_read, read_count in rows
+    }
+
+def serialize_conversations(conversations, read_state=None):
+    """Serialize conversations with one grouped query for all of their members
+    
+    read_state maps conversation ids to the viewer's (last_read_message_id,
+    unread_count); when given, each entry also gets its last message preview.
+    """
+    member_ids = {conv.id: [] for conv in conversations}
+    if member_ids:
+        rows = db.session.query(conversation_users.c.conversation_id, conversation_users.c.user_id).filter(
+            conversation_users.c.conversation_id.in_(list(member_ids))
+        ).order_by(conversation_users.c.user_id).all()
+        for conv_id, user_id in rows:
+            member_ids[conv_id].append(user_id)
+    
+    profiles = get_profiles([user_id for ids in member_ids.values() for user_id in ids])
+    members_by_conv = {
+        conv_id: [profiles[user_id] for user_id in ids if user_id in profiles]
+        for conv_id, ids in member_ids.items()
+    }
+    data = [conv.to_dict(members=members_by_conv[conv.id]) for conv in conversations]
+    if read_state is None:
+        return data
+    
+    last_ids = [conv.last_message_id for conv in conversations if conv.last_message_id]
+    last_messages = serialize_messages(Message.query.filter(Message.id.in_(last_ids)).all()) if last_ids else []
+    last_by_id = {message['id']: message for message in last_messages}
+    for entry in data:
+        last_read, unread = read_state.get(entry['id'], (0, 0))
+        entry['last_message'] = last_by_id.get(entry['last_message_id'])
+        entry['last_read_message_id'] = last_read
+        entry['unread_count'] = unread
+    return data
+
+# Message ingest
+def insert_messages(messages):
+    """Add new messages and run the per-message write hooks; the caller commits"""
+    db.session.add_all(messages)
+    db.session.flush()
+    for message in messages:
+        message_search.index(message)
+    count_new_messages(messages)
+    for message in messages:
+        record_change('message', message.conversation_id, message.id)
+
+def record_change(kind, conversation_id, message_id=None, user_id=None):
+    """Queue a change log entry; it is written when the caller commits"""
+    db.session.info.setdefault('changes', []).append(
+        {'kind': kind, 'conversation_id': conversation_id, 'message_id': message_id, 'user_id': user_id}
+    )
+
+@db.event.listens_for(db.session, 'before_commit')
+def write_change_log(session):
+    """Insert queued changes last, so sequence numbers become visible in commit order
+    
+    /api/sync hands out the highest seq it has seen as the next cursor. On
+    PostgreSQL a seq is drawn when its row is inserted, so without the lock
+    a transaction holding a lower seq could commit after a reader has moved
+    past it. SQLite already lets one writer at a time through.
+    """
+    changes = session.info.pop('changes', None)
+    if not changes:
+        return
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(db.text('SELECT pg_advisory_xact_lock(:key)'), {'key': CHANGE_LOG_LOCK})
+    session.execute(db.insert(ChangeLog), changes)
+
+@db.event.listens_for(db.session, 'after_transaction_end')
+def discard_change_log(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('changes', None)
+
+def compact_change_log(retention):
+    """Drop change log entries older than retention seconds, always keeping the newest"""
+    newest = db.session.query(db.func.max(ChangeLog.seq)).scalar()
+    if newest is None:
+        return 0
+    deleted = db.session.execute(db.delete(ChangeLog).where(
+        ChangeLog.created_at < datetime.utcnow() - timedelta(seconds=retention),
+        ChangeLog.seq < newest
+    )).rowcount
+    db.session.commit()
+    return deleted
+
+def advance_read_cursor(conv_id, user_id, message_id=None):
+    """UPDATE moving a member's read cursor forward to message_id, or to the latest message
+    
+    read_count is worked out in the same statement, as the conversation's
+    message_count less the messages after the cursor, so a message inserted
+    concurrently is either counted as read or stays unread.
+    """
+    latest = db.select(db.func.coalesce(Conversation.last_message_id, 0)).where(Conversation.id == conv_id).scalar_subquery()
+    cursor = latest if message_id is None else db.case((latest > message_id, message_id), else_=latest)
+    message_count = db.select(Conversation.message_count).where(Conversation.id == conv_id).scalar_subquery()
+    after_cursor = db.select(db.func.count(Message.id)).where(
+        Message.conversation_id == conv_id,
+        Message.id > cursor,
+        Message.is_deleted == False
+    ).scalar_subquery()
+    return db.update(conversation_users).where(
+        conversation_users.c.conversation_id == conv_id,
+        conversation_users.c.user_id == user_id,
+        conversation_users.c.last_read_message_id < cursor
+    ).values(last_read_message_id=cursor, read_count=message_count - after_cursor)
+
+def count_new_messages(messages):
+    """Advance conversation counters for freshly inserted messages; other members' rows are not touched"""
+    by_conversation = {}
+    for message in messages:
+        by_conversation.setdefault(message.conversation_id, {}).setdefault(message.sender_id, []).append(message.id)
+    
+    for conv_id, by_sender in by_conversation.items():
+        last_id = max(msg_id for ids in by_sender.values() for msg_id in ids)
+        db.session.execute(db.update(Conversation).where(Conversation.id == conv_id).values(
+            message_count=Conversation.message_count + sum(len(ids) for ids in by_sender.values()),
+            last_message_id=db.case((Conversation.last_message_id > last_id, Conversation.last_message_id), else_=last_id)
+        ))
+        # Sending implies having read the conversation up to that point
+        for sender_id, ids in by_sender.items():
+            db.session.execute(advance_read_cursor(conv_id, sender_id, max(ids)))
+
+def uncount_message(message):
+    """Take a message that is being deleted out of the conversation counters"""
+    # Members who had read it keep read_count in step with message_count
+    db.session.execute(db.update(conversation_users).where(
+        conversation_users.c.conversation_id == message.conversation_id,
+        conversation_users.c.last_read_message_id >= message.id,
+        conversation_users.c.read_count > 0
+    ).values(read_count=conversation_users.c.read_count - 1))
+    
+    previous = db.select(db.func.max(Message.id)).where(
+        Message.conversation_id == message.conversation_id,
+        Message.is_deleted == False,
+        Message.id != message.id
+    ).scalar_subquery()
+    db.session.execute(db.update(Conversation).where(Conversation.id == message.conversation_id).values(
+        message_count=db.case((Conversation.message_count > 0, Conversation.message_count - 1), else_=0),
+        last_message_id=db.case((Conversation.last_message_id == message.id, previous), else_=Conversation.last_message_id)
+    ))
+
+def mark_read(conv_id, user_id, message_id=None):
+    """Move a member's read cursor forward and return (last_read_message_id, unread_count)"""
+    db.session.execute(advance_read_cursor(conv_id, user_id, message_id))
+    db.session.commit()
+    
+    last_read, read_count, message_count = db.session.query(
+        conversation_users.c.last_read_message_id, conversation_users.c.read_count, Conversation.message_count
+    ).join(Conversation, Conversation.id == conversation_users.c.conversation_id).filter(
+        conversation_users.c.conversation_id == conv_id,
+        conversation_users.c.user_id == user_id
+    ).one()
+    return last_read, max(message_count - read_count, 0)
+
+def recount_conversations():
+    """Rebuild message_count, last_message_id and members' read_count from the messages table"""
+    live = db.select(db.func.count(Message.id)).where(
+        Message.conversation_id == Conversation.id, Message.is_deleted == False
+    ).scalar_subquery()
+    latest = db.select(db.func.max(Message.id)).where(
+        Message.conversation_id == Conversation.id, Message.is_deleted == False
+    ).scalar_subquery()
+    db.session.execute(db.update(Conversation).values(message_count=live, last_message_id=latest))
+    
+    read = db.select(db.func.count(Message.id)).where(
+        Message.conversation_id == conversation_users.c.conversation_id,
+        Message.id <= conversation_users.c.last_read_message_id,
+        Message.is_deleted == False
+    ).scalar_subquery()
+    db.session.execute(db.update(conversation_users).values(read_count=read))
+    db.session.commit()
+
+def commit_message_batch(batch):
+    """Group-commit writer: insert every queued message in a single transaction"""
+    with app.app_context():
+        messages = [Message(**values) for values in batch]
+        insert_messages(messages)
+        acks = [{'id': message.id, 'created_at': message.created_at} for message in messages]
+        db.session.commit()
+    return acks
+
+def ensure_background_task(name, target):
+    """Start target with socketio.start_background_task once per process"""
+    with _background_lock:
+        if name not in _background_tasks:
+            _background_tasks[name] = socketio.start_background_task(target)
+
+def init_db():
+    """Create tables and the structures that db.create_all() does not know about"""
+    db.create_all()
+    upgrade_schema()
+    message_search.create_schema()
+
+def upgrade_schema():
+    """Bring tables created by an older version up to the models; create_all() skips existing tables"""
+    inspector = db.inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    index_names = lambda table_name: {index['name'] for index in inspector.get_indexes(table_name)} | {
+        constraint['name'] for constraint in inspector.get_unique_constraints(table_name)
+    }
+    added = []
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(db.engine.dialect)}'
+            if not column.nullable:
+                ddl += f' DEFAULT {column.default.arg!r} NOT NULL'
+            db.session.execute(db.text(ddl))
+            added.append(f'{table.name}.{column.name}')
+        
+        indexes = index_names(table.name)
+        for index in table.indexes:
+            if index.name not in indexes:
+                db.session.execute(db.text(
+                    f"CREATE {'UNIQUE ' if index.unique else ''}INDEX {quote(index.name)} ON {quote(table.name)} "
+                    f"({', '.join(quote(column.name) for column in index.columns)})"
+                ))
+    
+    # One row per (message, emoji): fold duplicates into the oldest before enforcing it
+    if 'uq_reaction_message_emoji' not in index_names('reaction'):
+        db.session.execute(db.text(
+            'UPDATE reaction SET count = (SELECT SUM(other.count) FROM reaction other '
+            'WHERE other.message_id = reaction.message_id AND other.emoji = reaction.emoji) '
+            'WHERE id IN (SELECT MIN(id) FROM reaction GROUP BY message_id, emoji HAVING COUNT(*) > 1)'
+        ))
+        db.session.execute(db.text(
+            'DELETE FROM reaction WHERE id NOT IN (SELECT MIN(id) FROM reaction GROUP BY message_id, emoji)'
+        ))
+        db.session.execute(db.text('CREATE UNIQUE INDEX uq_reaction_message_emoji ON reaction (message_id, emoji)'))
+    db.session.commit()
+    
+    # The counters start at zero; fill them in from the existing messages once
+    if {'conversation.message_count', 'conversation_users.read_count'} & set(added):
+        recount_conversations()
+    if added:
+        app.logger.info('Added columns %s', ', '.join(added))
+
+def sync_user_index():
+    """Build the user index on first use, then pick up users registered on other workers"""
+    global _user_index_synced_at
+    with _user_index_lock:
+        if not user_index.ready:
+            user_index.build(db.session.query(User.id, User.username, User.display_name).all())
+        elif time.monotonic() - _user_index_synced_at >= app.config['USER_INDEX_SYNC_INTERVAL']:
+            for row in db.session.query(User.id, User.username, User.display_name).filter(
+                User.id > user_index.max_user_id
+            ):
+                user_index.add(*row)
+        else:
+            return
+        _user_index_synced_at = time.monotonic()
+
+# Presence
+def presence_rooms(user_id):
+    """Rooms interested in a user's status: their contacts and shared conversations"""
+    watcher_ids = db.session.query(Contact.user_id).filter(Contact.contact_id == user_id)
+    conv_ids = db.session.query(conversation_users.c.conversation_id).filter(
+        conversation_users.c.user_id == user_id
+    )
+    return [f'user_{watcher_id}' for (watcher_id,) in watcher_ids] + [f'conv_{conv_id}' for (conv_id,) in conv_ids]
+
+def broadcast_status(user_id, status):
+    rooms = presence_rooms(user_id)
+    if rooms:
+        socketio.emit('status_changed', {'user_id': user_id, 'status': status}, to=rooms)
+
+def flush_presence():
+    """Write pending status and last_seen changes in one batched UPDATE"""
+    dirty = presence.take_dirty()
+    if not dirty:
+        return
+    db.session.execute(db.update(User), [
+        {'id': user_id, 'status': status, 'last_seen': last_seen}
+        for user_id, (status, last_seen) in dirty.items()
+    ])
+    db.session.commit()
+    for user_id in dirty:
+        invalidate_user(user_id)
+
+def presence_worker():
+    next_flush = time.monotonic() + app.config['PRESENCE_FLUSH_INTERVAL']
+    while True:
+        socketio.sleep(1)
+        try:
+            with app.app_context():
+                for user_id in presence.expire():
+                    broadcast_status(user_id, 'offline')
+                if time.monotonic() >= next_flush:
+                    next_flush = time.monotonic() + app.config['PRESENCE_FLUSH_INTERVAL']
+                    flush_presence()
+        except Exception:
+            app.logger.exception('Presence worker failed')
+
+# Typing indicators
+def typing_worker():
+    while True:
+        socketio.sleep(app.config['TYPING_BROADCAST_INTERVAL'])
+        try:
+            for conv_id, users in typing_state.collect().items():
+                socketio.emit('typing_state', {
+                    'conversation_id': conv_id,
+                    'users': [{'user_id': user_id, 'username': username} for user_id, username in users]
+                }, to=f'conv_{conv_id}')
+        except Exception:
+            app.logger.exception('Typing worker failed')
+
+# Routes - Authentication
+@app.route('/api/auth/register', methods=['POST'])
+def register():
+    data = request.get_json()
+    
+    if not data or not all(k in data for k in ['username', 'email', 'password']):
+        return jsonify({'error': 'Missing required fields'}), 400
+    
+    if User.query.filter_by(username=data['username']).first():
+        return jsonify({'error': 'Username already exists'}), 409
+    
+    if User.query.filter_by(email=data['email']).first():
+        return jsonify({'error': 'Email already exists'}), 409
+    
+    user = User(
+        username=data['username'],
+        email=data['email'],
+        display_name=data.get('display_name', data['username'])
+    )
+    user.set_password(data['password'])
+    
+    db.session.add(user)
+    db.session.commit()
+    user_index.add(user.id, user.username, user.display_name)
+    
+    login_user(user)
+    return jsonify({
+        'message': 'Registration successful',
+        'user': user.to_dict(include_email=True),
+        'token': get_jwt_token(user.id)
+    }), 201
+
+@app.route('/api/auth/login', methods=['POST'])
+def login():
+    data = request.get_json()
+    
+    if not data or not all(k in data for k in ['username', 'password']):
+        return jsonify({'error': 'Missing required fields'}), 400
+    
+    user = User.query.filter_by(username=data['username']).first()
+    
+    if not user or not user.check_password(data['password']):
+        return jsonify({'error': 'Invalid credentials'}), 401
+    
+    login_user(user)
+    return jsonify({
+        'message': 'Login successful',
+        'user': user.to_dict(include_email=True),
+        'token': get_jwt_token(user.id)
+    }), 200
+
+@app.route('/api/auth/logout', methods=['POST'])
+@login_required
+def logout():
+    logout_user()
+    return jsonify({'message': 'Logout successful'}), 200
+
+@app.route('/api/auth/me', methods=['GET'])
+@login_required
+def get_current_user():
+    return jsonify(current_user.to_dict(include_email=True)), 200
+
+# Routes - Users
+@app.route('/api/users/<username>', methods=['GET'])
+def get_user(username):
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    return jsonify(user.to_dict()), 200
+
+@app.route('/api/users/search/<query>', methods=['GET'])
+@login_required
+def search_users(query):
+    sync_user_index()
+    user_ids = user_index.search(query, limit=20)
+    profiles = get_profiles(user_ids)
+    return jsonify([profiles[user_id] for user_id in user_ids if user_id in profiles]), 200
+
+@app.route('/api/users/<user_id>/profile', methods=['PUT'])
+@login_required
+def update_profile(user_id):
+    if current_user.id != int(user_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json()
+    
+    current_user.display_name = data.get('display_name', current_user.display_name)
+    current_user.bio = data.get('bio', current_user.bio)
+    current_user.status = data.get('status', current_user.status)
+    
+    db.session.commit()
+    invalidate_user(current_user.id)
+    user_index.add(current_user.id, current_user.username, current_user.display_name)
+    return jsonify(current_user.to_dict(include_email=True)), 200
+
+@app.route('/api/users/<user_id>/avatar', methods=['POST'])
+@login_required
+def upload_avatar(user_id):
+    if current_user.id != int(user_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    if file and allowed_file(file.filename):
+        filename = f"avatar_{user_id}_{secrets.token_hex(8)}.{file.filename.rsplit('.', 1)[1].lower()}"
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        save_stream(file.stream, filepath)
+        avatar_url = f'/uploads/{filename}'
+        current_user.avatar = avatar_url
+        db.session.commit()
+        invalidate_user(current_user.id)
+        
+        if is_image(filename):
+            media.submit(filepath, media_key(filename), ['avatar'],
+                         partial(record_avatar_media, current_user.id, avatar_url))
+        return jsonify({'avatar_url': avatar_url}), 200
+    
+    return jsonify({'error': 'Invalid file type'}), 400
+
+@app.route('/api/stats/caches', methods=['GET'])
+@login_required
+def get_cache_stats():
+    return jsonify({
+        'users': user_cache.stats(),
+        'profiles': profile_cache.stats(),
+        'memberships': membership_cache.stats()
+    }), 200
+
+# Routes - Metrics
+def socketio_room_sizes():
+    """Member counts of this process's conversation and user rooms, by kind"""
+    sizes = {}
+    for room, participants in list(socketio.server.manager.rooms.get('/', {}).items()):
+        if isinstance(room, str) and room.startswith(('conv_', 'user_')):
+            sizes.setdefault(room.split('_', 1)[0], []).append(len(participants))
+    return sizes
+
+def cache_metric(field):
+    caches = {'users': user_cache, 'profiles': profile_cache, 'memberships': membership_cache}
+    return lambda: {(name,): cache.stats()[field] for name, cache in caches.items()}
+
+metrics.register('socketio_connected_sockets', 'gauge', 'Open Socket.IO connections',
+                 lambda: len(socketio.server.eio.sockets))
+metrics.register('online_users', 'gauge', 'Users with at least one authenticated socket', presence.online_users)
+metrics.register('socketio_rooms', 'gauge', 'Rooms with at least one member, by kind',
+                 lambda: {(kind,): len(sizes) for kind, sizes in socketio_room_sizes().items()}, ('kind',))
+metrics.register('socketio_room_members_max', 'gauge', 'Members of the largest room, by kind',
+                 lambda: {(kind,): max(sizes) for kind, sizes in socketio_room_sizes().items()}, ('kind',))
+metrics.register('cache_entries', 'gauge', 'Entries in the per-process caches', cache_metric('size'), ('cache',))
+metrics.register('cache_hits_total', 'counter', 'Cache lookups that found a live entry', cache_metric('hits'), ('cache',))
+metrics.register('cache_misses_total', 'counter', 'Cache lookups that missed or found an expired entry', cache_metric('misses'), ('cache',))
+metrics.register('ingest_batches_total', 'counter', 'Group-commit transactions', lambda: ingest_writer.stats()['batches'])
+metrics.register('ingest_messages_total', 'counter', 'Messages written by group commit', lambda: ingest_writer.stats()['items'])
+metrics.register('ingest_queue_depth', 'gauge', 'Messages waiting for the group-commit writer', lambda: ingest_writer.stats()['queued'])
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Not found'}), 404
+    token = app.config['METRICS_TOKEN']
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Routes - Conversations
+@app.route('/api/conversations', methods=['GET'])
+@login_required
+def get_conversations():
+    conversations, read_state = member_conversations(current_user.id)
+    return jsonify(serialize_conversations(conversations, read_state)), 200
+
+@app.route('/api/conversations', methods=['POST'])
+@login_required
+def create_conversation():
+    data = request.get_json()
+    
+    if not data or 'title' not in data:
+        return jsonify({'error': 'Title is required'}), 400
+    
+    conversation = Conversation(
+        title=data['title'],
+        description=data.get('description', ''),
+        is_group=data.get('is_group', False),
+        creator_id=current_user.id
+    )
+    
+    db.session.add(conversation)
+    db.session.flush()
+    
+    conversation.members.append(current_user)
+    
+    if 'members' in data:
+        for member_id in data['members']:
+            member = User.query.get(member_id)
+            if member:
+                conversation.members.append(member)
+    
+    for member in conversation.members:
+        record_change('member_added', conversation.id, user_id=member.id)
+    db.session.commit()
+    invalidate_membership(conversation.id, get_member_ids(conversation.id))
+    return jsonify(conversation.to_dict()), 201
+
+@app.route('/api/conversations/<int:conv_id>', methods=['GET'])
+@login_required
+def get_conversation(conv_id):
+    conversation = Conversation.query.get(conv_id)
+    if not conversation or not is_member(conv_id, current_user.id):
+        return jsonify({'error': 'Conversation not found'}), 404
+    
+    default_limit = app.config['SNAPSHOT_MESSAGE_LIMIT']
+    message_limit = min(max(request.args.get('messages', default_limit, type=int), 0), 100)
+    return jsonify(conversation_snapshot(conversation, message_limit)), 200
+
+@app.route('/api/conversations/<conv_id>', methods=['PUT'])
+@login_required
+def update_conversation(conv_id):
+    conversation = Conversation.query.get(conv_id)
+    if not conversation or conversation.creator_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json()
+    conversation.title = data.get('title', conversation.title)
+    conversation.description = data.get('description', conversation.description)
+    conversation.updated_at = datetime.utcnow()
+    record_change('conversation', conversation.id)
+    
+    db.session.commit()
+    return jsonify(conversation.to_dict()), 200
+
+@app.route('/api/conversations/<int:conv_id>/members', methods=['POST'])
+@login_required
+def add_member(conv_id):
+    conversation = Conversation.query.get(conv_id)
+    if not conversation or not is_member(conv_id, current_user.id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json()
+    user = User.query.get(data.get('user_id'))
+    
+    if user and not is_member(conv_id, user.id):
+        conversation.members.append(user)
+        db.session.flush()
+        # New members start with the existing history read
+        db.session.execute(advance_read_cursor(conv_id, user.id))
+        record_change('member_added', conv_id, user_id=user.id)
+        db.session.commit()
+        invalidate_membership(conv_id, [user.id])
+        return jsonify(conversation.to_dict()), 200
+    
+    return jsonify({'error': 'User not found or already member'}), 400
+
+@app.route('/api/conversations/<int:conv_id>/members/<member_id>', methods=['DELETE'])
+@login_required
+def remove_member(conv_id, member_id):
+    conversation = Conversation.query.get(conv_id)
+    if not conversation or (conversation.creator_id != current_user.id and int(member_id) != current_user.id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    member = User.query.get(member_id)
+    if member and is_member(conv_id, member.id):
+        conversation.members.remove(member)
+        record_change('member_removed', conv_id, user_id=member.id)
+        db.session.commit()
+        invalidate_membership(conv_id, [member.id])
+        return jsonify({'message': 'Member removed'}), 200
+    
+    return jsonify({'error': 'Member not found'}), 404
+
+# Routes - Messages
+@app.route('/api/conversations/<int:conv_id>/messages', methods=['GET'])
+@login_required
+def get_messages(conv_id):
+    if not is_member(conv_id, current_user.id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if any(arg in request.args for arg in ('before', 'after', 'limit')):
+        before = request.args.get('before')
+        after = request.args.get('after')
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 100)
+        try:
+            messages, has_more = paginate_messages(conv_id, before=before, after=after, limit=limit)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        # next_cursor walks back into older history, prev_cursor forward to newer messages
+        older_exists = bool(messages) and (has_more or after is not None)
+        return jsonify({
+            'messages': serialize_messages(messages),
+            'next_cursor': encode_cursor(messages[0]) if older_exists else None,
+            'prev_cursor': encode_cursor(messages[-1]) if messages else after,
+            'has_more': has_more
+        }), 200
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    
+    messages = Message.query.filter_by(conversation_id=conv_id).order_by(
+        Message.created_at.desc()
+    ).paginate(page=page, per_page=per_page)
+    
+    return jsonify({
+        'messages': serialize_messages(list(reversed(messages.items))),
+        'total': messages.total,
+        'pages': messages.pages,
+        'current_page': page
+    }), 200
+
+@app.route('/api/conversations/<int:conv_id>/messages', methods=['POST'])
+@login_required
+def send_message(conv_id):
+    if not is_member(conv_id, current_user.id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json()
+    
+    if not data or 'content' not in data:
+        return jsonify({'error': 'Content is required'}), 400
+    
+    values = {
+        'content': data['content'],
+        'sender_id': current_user.id,
+        'conversation_id': conv_id,
+        'message_type': data.get('message_type', 'text')
+    }
+    
+    if app.config['INGEST_GROUP_COMMIT']:
+        ensure_background_task('ingest', ingest_writer.run)
+        try:
+            message = Message(is_edited=False, is_deleted=False, **values, **ingest_writer.submit(values))
+        except TimeoutError:
+            # Not written, so the client can retry without creating a duplicate
+            return jsonify({'error': 'Message queue is busy, try again'}), 503
+        payload = message.to_dict(reactions={})
+    else:
+        message = Message(**values)
+        insert_messages([message])
+        payload = message.to_dict(reactions={})
+        db.session.commit()
+    
+    fanout.emit_to_users('new_message', payload, get_member_ids(conv_id))
+    
+    return jsonify(payload), 201
+
+@app.route('/api/conversations/<int:conv_id>/messages:batch', methods=['POST'])
+@login_required
+def send_message_batch(conv_id):
+    if not is_member(conv_id, current_user.id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    entries = (request.get_json(silent=True) or {}).get('messages')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'messages must be a non-empty list'}), 400
+    if len(entries) > app.config['MESSAGE_BATCH_LIMIT']:
+        return jsonify({'error': f"At most {app.config['MESSAGE_BATCH_LIMIT']} messages per batch"}), 413
+    if not all(isinstance(entry, dict) and 'content' in entry for entry in entries):
+        return jsonify({'error': 'Content is required'}), 400
+    
+    messages = [Message(
+        content=entry['content'],
+        sender_id=current_user.id,
+        conversation_id=conv_id,
+        message_type=entry.get('message_type', 'text')
+    ) for entry in entries]
+    insert_messages(messages)
+    payloads = [message.to_dict(reactions={}) for message in messages]
+    db.session.commit()
+    
+    member_ids = get_member_ids(conv_id)
+    for payload in payloads:
+        fanout.emit_to_users('new_message', payload, member_ids)
+    
+    return jsonify({'messages': payloads}), 201
+
+@app.route('/api/messages/<msg_id>/file', methods=['POST'])
+@login_required
+def upload_file(msg_id):
+    message = Message.query.get(msg_id)
+    if not message or message.sender_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    if file and allowed_file(file.filename):
+        temp_path = blob_store.temp_path()
+        size, digest = save_stream(file.stream, temp_path)
+        attach_blob(message, digest, size, file.filename)
+        blob_store.put(temp_path, digest)
+        
+        db.session.commit()
+        process_message_media(message)
+        return jsonify(message.to_dict()), 200
+    
+    return jsonify({'error': 'Invalid file type'}), 400
+
+# Content-addressed blobs, reference counted by Message.file_url
+def blob_token(digest):
+    """Keyed part of a blob's file name, so knowing a file's content is not enough to fetch it"""
+    return hmac.new(app.config['SECRET_KEY'].encode(), digest.encode(), hashlib.sha256).hexdigest()[:32]
+
+def blob_url(digest, extension):
+    return f'/uploads/{digest}.{blob_token(digest)}{extension}'
+
+def can_read_blob(digest, user_id):
+    """Whether a message the user can already see carries this blob"""
+    return db.session.query(db.exists().where(
+        Message.file_url.startswith(f'/uploads/{digest}.'),
+        Message.is_deleted == False,
+        Message.conversation_id.in_(db.select(conversation_users.c.conversation_id).where(
+            conversation_users.c.user_id == user_id
+        ))
+    )).scalar()
+
+def blob_digest(file_url):
+    """The blob digest a file URL points at, or None for other files"""
+    if not file_url or not file_url.startswith('/uploads/'):
+        return None
+    digest = file_url[len('/uploads/'):].split('.', 1)[0]
+    return digest if DIGEST_RE.match(digest) else None
+
+def acquire_blob(digest, size):
+    increment = db.update(Blob).where(Blob.sha256 == digest).values(
+        ref_count=Blob.ref_count + 1, released_at=None
+    )
+    if db.session.execute(increment).rowcount == 0:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(Blob).values(sha256=digest, size=size, ref_count=1))
+        except IntegrityError:
+            db.session.execute(increment)
+
+def release_blob(digest):
+    db.session.execute(db.update(Blob).where(Blob.sha256 == digest).values(
+        ref_count=Blob.ref_count - 1,
+        released_at=db.case((Blob.ref_count <= 1, datetime.utcnow()), else_=Blob.released_at)
+    ))
+
+def attach_blob(message, digest, size, original_name):
+    """Point a message at a blob, moving reference counts from any previous file"""
+    previous = blob_digest(message.file_url)
+    acquire_blob(digest, size)
+    if previous:
+        release_blob(previous)
+    
+    extension = os.path.splitext(secure_filename(original_name))[1].lower()[:16]
+    message.file_url = blob_url(digest, extension)
+    message.file_name = original_name
+    message.file_size = size
+    message.message_type = 'file'
+    message.width = message.height = message.thumbnail_url = None
+    record_change('message_edited', message.conversation_id, message.id)
+
+def collect_blob_garbage(grace_period):
+    """Delete unreferenced blobs and stray files older than grace_period seconds"""
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_period)
+    released = [digest for (digest,) in db.session.query(Blob.sha256).filter(
+        Blob.ref_count <= 0, Blob.released_at < cutoff
+    )]
+    removed = 0
+    for digest in released:
+        # The file goes while the row deletion is still uncommitted, so a concurrent
+        # acquire_blob waits for the writer and then stores the file again
+        deleted = db.session.execute(db.delete(Blob).where(Blob.sha256 == digest, Blob.ref_count <= 0))
+        if deleted.rowcount:
+            blob_store.delete(digest)
+            media.remove(digest)
+            removed += 1
+        db.session.commit()
+    
+    # Files whose database row was never committed, e.g. after a failed request. A placeholder
+    # row makes a concurrent upload of the same digest wait until the file is gone
+    for digest in blob_store.stored_digests(older_than=grace_period):
+        if db.session.get(Blob, digest) is not None:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(Blob).values(sha256=digest, size=0, ref_count=0))
+        except IntegrityError:
+            db.session.rollback()
+            continue
+        blob_store.delete(digest)
+        media.remove(digest)
+        db.session.execute(db.delete(Blob).where(Blob.sha256 == digest))
+        db.session.commit()
+        removed += 1
+    return removed
+
+# Media pipeline callbacks, run on its worker threads once an image is processed
+def process_message_media(message):
+    """Queue thumbnail generation for an image attachment"""
+    digest = blob_digest(message.file_url)
+    if not digest or not is_image(message.file_name):
+        return
+    media.submit(blob_store.path(digest), digest, ['thumb'],
+                 partial(record_message_media, message.id, message.conversation_id, message.file_url))
+
+def record_message_media(message_id, conversation_id, file_url, width, height):
+    thumbnail_url = f'{file_url}?variant=thumb'
+    with app.app_context():
+        updated = db.session.execute(db.update(Message).where(
+            Message.id == message_id, Message.file_url == file_url
+        ).values(width=width, height=height, thumbnail_url=thumbnail_url))
+        if updated.rowcount:
+            record_change('message_edited', conversation_id, message_id)
+        db.session.commit()
+    if updated.rowcount:
+        socketio.emit('message_media', {
+            'message_id': message_id,
+            'conversation_id': conversation_id,
+            'width': width,
+            'height': height,
+            'thumbnail_url': thumbnail_url
+        }, room=f'conv_{conversation_id}')
+
+def record_avatar_media(user_id, avatar_url, width, height):
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == user_id, User.avatar == avatar_url).values(
+            avatar=f'{avatar_url}?variant=avatar'
+        ))
+        db.session.commit()
+        invalidate_user(user_id)
+
+@app.cli.command('compact-changes')
+@click.option('--retention', default=None, type=int, help='Seconds of change history to keep')
+def compact_changes_command(retention):
+    """Trim the sync change log; clients further behind get a full snapshot"""
+    retention = retention if retention is not None else app.config['SYNC_LOG_RETENTION']
+    click.echo(f'Removed {compact_change_log(retention)} change log entries')
+
+@app.cli.command('recount-conversations')
+def recount_conversations_command():
+    """Recompute conversation message counters and read positions, e.g. after an upgrade"""
+    recount_conversations()
+    click.echo(f'Recounted {Conversation.query.count()} conversations')
+
+@app.cli.command('gc-uploads')
+@click.option('--grace', default=3600, help='Seconds an unreferenced blob is kept before removal')
+def gc_uploads_command(grace):
+    """Remove upload blobs no longer referenced by any message"""
+    click.echo(f'Removed {collect_blob_garbage(grace)} blobs')
+
+# Routes - Chunked uploads
+def upload_error(error):
+    return jsonify({'error': str(error), **error.details}), error.status
+
+def get_own_upload(upload_id):
+    upload = chunked_uploads.get(upload_id)
+    if upload is None or upload['owner_id'] != current_user.id:
+        return None
+    return upload
+
+def upload_status(upload):
+    return {
+        'upload_id': upload['id'],
+        'message_id': upload['message_id'],
+        'filename': upload['filename'],
+        'size': upload['size'],
+        'received': upload['received']
+    }
+
+@app.route('/api/uploads', methods=['POST'])
+@login_required
+def start_upload():
+    data = request.get_json() or {}
+    message = Message.query.get(data['message_id']) if data.get('message_id') else None
+    if not message or message.sender_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    filename = data.get('filename') or ''
+    if not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+    size = data.get('size')
+    if size is not None and not isinstance(size, int):
+        return jsonify({'error': 'Invalid size'}), 400
+    
+    # Content the user can already see in another message is attached without transferring
+    # it again; anything else is uploaded and deduplicated once the server has hashed it
+    digest = (data.get('sha256') or '').lower()
+    if DIGEST_RE.match(digest) and size is not None:
+        blob = db.session.get(Blob, digest)
+        if blob and blob.size == size and can_read_blob(digest, current_user.id):
+            attach_blob(message, digest, size, filename)
+            # Checked after the reference is taken: the garbage collector may have removed the file before
+            if blob_store.exists(digest):
+                db.session.commit()
+                process_message_media(message)
+                return jsonify({'complete': True, 'message': message.to_dict()}), 200
+            db.session.rollback()
+    
+    try:
+        upload = chunked_uploads.start(current_user.id, message.id, filename, size)
+    except UploadError as e:
+        return upload_error(e)
+    return jsonify(dict(upload_status(upload), complete=False)), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required
+def get_upload(upload_id):
+    upload = get_own_upload(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload_status(upload)), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def put_upload_chunk(upload_id):
+    upload = get_own_upload(upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    # The range start comes from Content-Range ("bytes 0-65535/*"), ?offset=, or defaults to appending
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is not None:
+        offset = content_range.start
+    else:
+        offset = request.args.get('offset', upload['received'], type=int)
+    
+    try:
+        received = chunked_uploads.write(upload_id, offset, request.stream)
+    except UploadError as e:
+        return upload_error(e)
+    return jsonify(dict(upload_status(upload), received=received)), 200
+
+@app.route('/api/uploads/<upload_id>/commit', methods=['POST'])
+@login_required
+def commit_upload(upload_id):
+    if not get_own_upload(upload_id):
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    try:
+        upload, path, size, digest = chunked_uploads.finish(upload_id)
+    except UploadError as e:
+        return upload_error(e)
+    
+    expected = (request.get_json(silent=True) or {}).get('sha256')
+    if expected and expected.lower() != digest:
+        chunked_uploads.discard(upload_id)
+        return jsonify({'error': 'Checksum mismatch', 'sha256': digest}), 422
+    
+    message = Message.query.get(upload['message_id'])
+    if not message or message.sender_id != current_user.id:
+        chunked_uploads.discard(upload_id)
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    attach_blob(message, digest, size, upload['filename'])
+    blob_store.put(path, digest)
+    chunked_uploads.discard(upload_id)
+    
+    db.session.commit()
+    process_message_media(message)
+    return jsonify(dict(message.to_dict(), sha256=digest)), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel_upload(upload_id):
+    if not get_own_upload(upload_id):
+        return jsonify({'error': 'Upload not found'}), 404
+    chunked_uploads.discard(upload_id)
+    return jsonify({'message': 'Upload cancelled'}), 200
+
+@app.route('/api/messages/<msg_id>', methods=['PUT'])
+@login_required
+def edit_message(msg_id):
+    message = Message.query.get(msg_id)
+    if not message or message.sender_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json()
+    message.content = data.get('content', message.content)
+    message.is_edited = True
+    message.edited_at = datetime.utcnow()
+    message_search.index(message)
+    record_change('message_edited', message.conversation_id, message.id)
+    
+    patch = {
+        'id': message.id,
+        'conversation_id': message.conversation_id,
+        'content': message.content,
+        'is_edited': True,
+        'edited_at': message.edited_at.isoformat()
+    }
+    db.session.commit()
+    
+    room = f'conv_{patch["conversation_id"]}'
+    socketio.emit('message_patch', patch, room=room)
+    if app.config['FULL_MESSAGE_EVENTS']:
+        payload = message.to_dict()
+        socketio.emit('message_edited', payload, room=room)
+        return jsonify(payload), 200
+    
+    return jsonify(patch), 200
+
+@app.route('/api/messages/<msg_id>', methods=['DELETE'])
+@login_required
+def delete_message(msg_id):
+    message = Message.query.get(msg_id)
+    if not message or message.sender_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if not message.is_deleted:
+        uncount_message(message)
+    message.is_deleted = True
+    message.content = ''
+    message_search.remove(message.id)
+    
+    digest = blob_digest(message.file_url)
+    if digest:
+        release_blob(digest)
+    message.file_url = message.file_name = message.file_size = None
+    message.width = message.height = message.thumbnail_url = None
+    record_change('message_deleted', message.conversation_id, message.id)
+    
+    deleted = {'message_id': message.id, 'conversation_id': message.conversation_id}
+    db.session.commit()
+    
+    socketio.emit('message_deleted', deleted, room=f'conv_{deleted["conversation_id"]}')
+    
+    return jsonify({'message': 'Message deleted'}), 200
+
+@app.route('/api/messages/<msg_id>/react', methods=['POST'])
+@login_required
+def add_reaction(msg_id):
+    message = Message.query.get(msg_id)
+    if not message:
+        return jsonify({'error': 'Message not found'}), 404
+    
+    data = request.get_json()
+    emoji = data.get('emoji') if data else None
+    if not emoji:
+        return jsonify({'error': 'Emoji is required'}), 400
+    
+    delta = {
+        'message_id': message.id,
+        'conversation_id': message.conversation_id,
+        'emoji': emoji,
+        'count': increment_reaction(message.id, emoji)
+    }
+    record_change('reaction', message.conversation_id, message.id)
+    db.session.commit()
+    
+    room = f'conv_{delta["conversation_id"]}'
+    socketio.emit('reaction_delta', delta, room=room)
+    if app.config['FULL_MESSAGE_EVENTS']:
+        payload = message.to_dict()
+        socketio.emit('message_reacted', payload, room=room)
+        return jsonify(payload), 200
+    
+    return jsonify(delta), 200
+
+# Routes - Sync
+@app.route('/api/sync', methods=['GET'])
+@login_required
+def sync_changes():
+    """Changes since a sequence number, or a full snapshot when they are no longer all logged"""
+    since = request.args.get('since', 0, type=int)
+    my_conversations = db.select(conversation_users.c.conversation_id).where(
+        conversation_users.c.user_id == current_user.id
+    )
+    oldest = db.session.query(db.func.min(ChangeLog.seq)).scalar()
+    
+    # Deltas are only complete when no entry after `since` has been compacted away
+    logged = since > 0 and oldest is not None and since >= oldest - 1
+    changes = []
+    if logged:
+        changes = ChangeLog.query.filter(
+            ChangeLog.seq > since,
+            db.or_(ChangeLog.conversation_id.in_(my_conversations), ChangeLog.user_id == current_user.id)
+        ).order_by(ChangeLog.seq).limit(app.config['SYNC_MAX_CHANGES'] + 1).all()
+    
+    if not logged or len(changes) > app.config['SYNC_MAX_CHANGES']:
+        # Take the sequence number first so nothing committed meanwhile is skipped next time
+        seq = db.session.query(db.func.max(ChangeLog.seq)).scalar() or 0
+        conversations, read_state = member_conversations(current_user.id)
+        return jsonify({
+            'full': True,
+            'seq': seq,
+            'conversations': serialize_conversations(conversations, read_state)
+        }), 200
+    
+    conv_ids = {change.conversation_id for change in changes}
+    message_ids = {change.message_id for change in changes if change.message_id}
+    conversations, read_state = member_conversations(current_user.id, conv_ids) if conv_ids else ([], {})
+    messages = []
+    if message_ids and read_state:
+        messages = Message.query.filter(
+            Message.id.in_(message_ids), Message.conversation_id.in_(list(read_state))
+        ).order_by(Message.id).all()
+    
+    return jsonify({
+        'full': False,
+        'seq': changes[-1].seq if changes else since,
+        'conversations': serialize_conversations(conversations, read_state),
+        'removed_conversation_ids': sorted(conv_ids - set(read_state)),
+        'messages': serialize_messages(messages)
+    }), 200
+
+# Routes - Search
+def search_response(conversation_id=None, user_id=None):
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    ids, has_more = message_search.search(
+        request.args.get('q', ''), conversation_id=conversation_id, user_id=user_id,
+        page=page, per_page=per_page
+    )
+    messages = {msg.id: msg for msg in Message.query.filter(Message.id.in_(ids))} if ids else {}
+    return jsonify({
+        'results': serialize_messages([messages[msg_id] for msg_id in ids if msg_id in messages]),
+        'page': page,
+        'per_page': per_page,
+        'has_more': has_more
+    }), 200
+
+@app.route('/api/conversations/<int:conv_id>/search', methods=['GET'])
+@login_required
+def search_conversation(conv_id):
+    if not is_member(conv_id, current_user.id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    return search_response(conversation_id=conv_id)
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search_messages():
+    return search_response(user_id=current_user.id)
+
+# Routes - File serving
+@app.route('/uploads/<filename>', methods=['GET'])
+def download_file(filename):
+    digest = media_key(filename)
+    upload_root = os.path.abspath(app.config['UPLOAD_FOLDER'])
+    if DIGEST_RE.match(digest):
+        token = filename.split('.', 2)[1] if filename.count('.') else ''
+        if not hmac.compare_digest(token, blob_token(digest)):
+            return jsonify({'error': 'File not found'}), 404
+        path, etag = blob_store.path(digest), digest
+    else:
+        path, etag = safe_join(upload_root, filename), True
+    if not path or not os.path.isfile(path):
+        return jsonify({'error': 'File not found'}), 404
+    
+    # Resized variants fall back to the original until the media pipeline has produced them
+    variant = request.args.get('variant')
+    has_variant = media.has_variant(digest, variant)
+    if has_variant:
+        path = media.variant_path(digest, variant)
+        etag = f'{digest}.{variant}' if etag is not True else True
+        filename = f'{digest}.{variant}.jpg'
+    # The fallback is revalidated on every use, so the variant replaces it once it exists;
+    # only a blob, or a variant that exists, is fixed for the lifetime of its URL
+    fallback = variant is not None and not has_variant
+    immutable = etag is not True and not fallback
+    
+    # A front proxy given X-Sendfile/X-Accel-Redirect handles Range itself
+    mode = app.config['UPLOAD_SERVE_MODE']
+    environ = request.environ
+    if mode != 'direct':
+        environ = {k: v for k, v in environ.items() if k not in ('HTTP_RANGE', 'HTTP_IF_RANGE')}
+    
+    # Direct mode streams through wsgi.file_wrapper, which servers implement with sendfile()
+    response = send_file_response(
+        path, environ, download_name=filename, conditional=True, etag=etag,
+        max_age=0 if fallback else app.config['UPLOAD_CACHE_MAX_AGE'], use_x_sendfile=mode != 'direct'
+    )
+    response.cache_control.immutable = immutable
+    if fallback:
+        response.cache_control.no_cache = True
+    
+    if mode == 'x-accel-redirect' and 'X-Sendfile' in response.headers:
+        relative = os.path.relpath(response.headers.pop('X-Sendfile'), upload_root).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = f"{app.config['UPLOAD_ACCEL_PREFIX'].rstrip('/')}/{relative}"
+    return response
+
+# Routes - Contacts
+@app.route('/api/contacts', methods=['GET'])
+@login_required
+def get_contacts():
+    contacts = Contact.query.filter_by(user_id=current_user.id).all()
+    profiles = get_profiles([c.contact_id for c in contacts])
+    return jsonify([{
+        'id': c.contact_id,
+        'name': c.contact_name,
+        'user': profiles.get(c.contact_id)
+    } for c in contacts]), 200
+
+@app.route('/api/contacts', methods=['POST'])
+@login_required
+def add_contact():
+    data = request.get_json()
+    contact_id = data.get('contact_id')
+    
+    if not contact_id or User.query.get(contact_id) is None:
+        return jsonify({'error': 'Invalid contact'}), 400
+    
+    contact = Contact(
+        user_id=current_user.id,
+        contact_id=contact_id,
+        contact_name=data.get('contact_name', '')
+    )
+    
+    db.session.add(contact)
+    db.session.commit()
+    
+    return jsonify({'message': 'Contact added'}), 201
+
+@app.route('/api/contacts/<contact_id>', methods=['DELETE'])
+@login_required
+def delete_contact(contact_id):
+    contact = Contact.query.filter_by(user_id=current_user.id, contact_id=contact_id).first()
+    if not contact:
+        return jsonify({'error': 'Contact not found'}), 404
+    
+    db.session.delete(contact)
+    db.session.commit()
+    
+    return jsonify({'message': 'Contact deleted'}), 200
+
+# WebSocket Events
+@socketio.on('connect')
+def handle_connect():
+    if current_user.is_authenticated:
+        ensure_background_task('presence', presence_worker)
+        join_room(f'user_{current_user.id}')
+        if presence.connect(current_user.id, request.sid):
+            broadcast_status(current_user.id, 'online')
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    if current_user.is_authenticated:
+        presence.disconnect(current_user.id, request.sid)
+
+@socketio.on('join_conversation')
+def on_join(data):
+    if current_user.is_authenticated:
+        conv_id = data.get('conversation_id')
+        room = f'conv_{conv_id}'
+        join_room(room)
+        emit('user_joined', {'user': get_profile(current_user.id)}, room=room)
+
+@socketio.on('leave_conversation')
+def on_leave(data):
+    if current_user.is_authenticated:
+        conv_id = data.get('conversation_id')
+        room = f'conv_{conv_id}'
+        leave_room(room)
+        emit('user_left', {'user_id': current_user.id}, room=room)
+
+@socketio.on('mark_read')
+def handle_mark_read(data):
+    if not current_user.is_authenticated or not isinstance(data, dict):
+        return
+    try:
+        conv_id = int(data.get('conversation_id'))
+        message_id = int(data['message_id']) if data.get('message_id') is not None else None
+    except (TypeError, ValueError):
+        return
+    if not is_member(conv_id, current_user.id):
+        return
+    
+    last_read, unread = mark_read(conv_id, current_user.id, message_id)
+    # Keeps badges in sync across the user's other tabs and devices
+    emit('read_state', {
+        'conversation_id': conv_id,
+        'last_read_message_id': last_read,
+        'unread_count': unread
+    }, room=f'user_{current_user.id}')
+
+@socketio.on('message_read')
+def handle_message_read(data):
+    """Older clients acknowledge single messages; treat that as reading up to them"""
+    if not current_user.is_authenticated or not isinstance(data, dict):
+        return
+    message = db.session.get(Message, data.get('message_id')) if isinstance(data.get('message_id'), int) else None
+    if message:
+        handle_mark_read({'conversation_id': message.conversation_id, 'message_id': message.id})
+
+def typing_conversation_id(data):
+    """Conversation id of a typing event, or None if the user may not signal there"""
+    try:
+        conv_id = int(data.get('conversation_id'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return conv_id if is_member(conv_id, current_user.id) else None
+
+@socketio.on('typing')
+def handle_typing(data):
+    if current_user.is_authenticated:
+        conv_id = typing_conversation_id(data)
+        if conv_id is not None:
+            ensure_background_task('typing', typing_worker)
+            typing_state.typing(conv_id, current_user.id, current_user.username)
+
+@socketio.on('stop_typing')
+def handle_stop_typing(data):
+    if current_user.is_authenticated:
+        conv_id = typing_conversation_id(data)
+        if conv_id is not None:
+            typing_state.stop(conv_id, current_user.id)
+
+# Error handlers
+@app.errorhandler(404)
+def not_found(error):
+    return jsonify({'error': 'Not found'}), 404
+
+@app.errorhandler(500)
+def internal_error(error):
+    db.session.rollback()
+    return jsonify({'error': 'Internal server error'}), 500
+
+# Frontend routes
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/chat/<conv_id>')
+def chat(conv_id):
+    return render_template('chat.html', conversation_id=conv_id)
+
+if __name__ == '__main__':
+    with app.app_context():
+        init_db()
+        sync_user_index()
+    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
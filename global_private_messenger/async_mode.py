@@ -0,0 +1,76 @@
+"""
+Server concurrency modes: threading, eventlet and gevent
+
+In threading mode every long-polling or WebSocket client holds an OS thread.
+eventlet and gevent serve each one from a green thread instead, which costs
+a few KiB, but the standard library has to be monkey-patched before anything
+else imports it, and blocking C calls (Pillow, a psycopg2 query without a wait
+callback) stall every client of the process. wsgi.py patches first; the
+helpers below keep CPU-bound work on native threads and make psycopg2 yield.
+"""
+
+ASYNC_MODES = ('threading', 'eventlet', 'gevent')
+
+
+def is_green(mode):
+    return mode in ('eventlet', 'gevent')
+
+
+def monkey_patch(mode):
+    """Patch the standard library for mode; must run before the app is imported"""
+    if mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()  # also makes psycopg2 cooperative when it is installed
+    elif mode == 'gevent':
+        from gevent import monkey
+        if not monkey.is_module_patched('socket'):
+            monkey.patch_all()
+        patch_psycopg_gevent()
+    elif mode not in ASYNC_MODES:
+        raise ValueError(f'Unknown async mode {mode!r}, expected one of {", ".join(ASYNC_MODES)}')
+
+
+def is_patched(mode):
+    """Whether the standard library has been patched for a green mode"""
+    if mode == 'eventlet':
+        from eventlet import patcher
+        return patcher.is_monkey_patched('thread')
+    if mode == 'gevent':
+        from gevent import monkey
+        return monkey.is_module_patched('threading')
+    return True
+
+
+def native_runner(mode):
+    """run(fn, *args) on a native OS thread, waiting cooperatively; None in threading mode"""
+    if mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute
+    if mode == 'gevent':
+        import gevent
+        return lambda fn, *args: gevent.get_hub().threadpool.apply(fn, args)
+    return None
+
+
+def patch_psycopg_gevent():
+    """Let psycopg2 wait on its socket through gevent instead of blocking the hub"""
+    try:
+        import psycopg2
+        from psycopg2 import extensions
+    except ImportError:
+        return
+    from gevent.socket import wait_read, wait_write
+    
+    def wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f'Bad result from poll: {state!r}')
+    
+    extensions.set_wait_callback(wait_callback)
@@ -0,0 +1,104 @@
+"""
+Shared helpers for the benchmark scripts
+
+Every benchmark runs against a throwaway SQLite database inside a temporary
+working directory, so it never touches messenger.db or the uploads folder.
+"""
+
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'benchmark'
+
+
+def load_app(workdir=None, database_url=None):
+    """Import the application bound to a fresh database and create its schema"""
+    workdir = workdir or tempfile.mkdtemp(prefix='messenger-bench-')
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app as messenger
+    with messenger.app.app_context():
+        messenger.init_db()
+    return messenger
+
+
+def create_users(messenger, count, prefix='user'):
+    """Insert users in bulk, bypassing the register route, and return their ids"""
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash(PASSWORD)
+    rows = [{
+        'username': f'{prefix}{i}',
+        'email': f'{prefix}{i}@bench.local',
+        'password_hash': password_hash,
+        'display_name': f'{prefix.title()} {i}'
+    } for i in range(count)]
+    with messenger.app.app_context():
+        messenger.db.session.execute(messenger.db.insert(messenger.User), rows)
+        messenger.db.session.commit()
+        users = messenger.User.query.filter(messenger.User.username.like(f'{prefix}%')).order_by(messenger.User.id)
+        return [user.id for user in users]
+
+
+def login(messenger, username):
+    """Return a test client with an authenticated session"""
+    client = messenger.app.test_client()
+    response = client.post('/api/auth/login', json={'username': username, 'password': PASSWORD})
+    assert response.status_code == 200, response.data
+    return client
+
+
+def add_messages(messenger, conv_id, sender_ids, count, batch_size=10000, content=None):
+    """Bulk insert count messages round-robin from sender_ids, oldest first
+    
+    content, if given, is called with the message index and returns its text.
+    """
+    content = content or (lambda i: f'benchmark message {i}')
+    if count <= 0:
+        return
+    with messenger.app.app_context():
+        start = datetime.utcnow() - timedelta(seconds=count)
+        for offset in range(0, count, batch_size):
+            rows = [{
+                'content': content(i),
+                'sender_id': sender_ids[i % len(sender_ids)],
+                'conversation_id': conv_id,
+                'message_type': 'text',
+                'created_at': start + timedelta(seconds=i)
+            } for i in range(offset, min(offset + batch_size, count))]
+            messenger.db.session.execute(messenger.db.insert(messenger.Message), rows)
+            messenger.db.session.commit()
+
+
+def measure(fn, repeat):
+    """Call fn repeat times and return the individual durations in seconds"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(durations):
+    """Latency summary in milliseconds"""
+    return {
+        'count': len(durations),
+        'mean_ms': sum(durations) / len(durations) * 1000 if durations else 0.0,
+        'p50_ms': percentile(durations, 50) * 1000,
+        'p95_ms': percentile(durations, 95) * 1000,
+        'p99_ms': percentile(durations, 99) * 1000
+    }
@@ -0,0 +1,164 @@
+"""
+Idle Socket.IO connections per async mode: memory and threads per socket
+
+    python benchmarks/connections.py [--connections 1000] [--modes threading eventlet gevent]
+                                     [--output results.json]
+
+Starts the server through wsgi.py once per SOCKETIO_ASYNC_MODE, opens the
+given number of authenticated WebSocket connections (shared between a few
+users, answering the server's pings) and lets them sit idle. It reports the
+server's resident memory and thread count before and after, and the cost of
+one idle socket. Modes whose package is not installed are skipped.
+
+Reads /proc, so it runs on Linux only. The clients use websocket-client.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import selectors
+import subprocess
+import importlib.util
+
+import requests
+import websocket
+
+from common import ROOT, PASSWORD
+
+
+def process_status(pid):
+    """(resident KiB, threads) of a process"""
+    with open(f'/proc/{pid}/status') as f:
+        fields = dict(line.split(':', 1) for line in f)
+    return int(fields['VmRSS'].split()[0]), int(fields['Threads'])
+
+
+def start_server(mode, port):
+    workdir = tempfile.mkdtemp(prefix='messenger-conn-')
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=mode, PORT=str(port), HOST='127.0.0.1',
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}", SESSION_COOKIE_SECURE='false')
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'wsgi.py')], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{mode} server exited with status {process.returncode}')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+class IdleSockets:
+    """Raw Engine.IO WebSocket clients that only answer pings"""
+    
+    def __init__(self, port):
+        self.url = f'ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket'
+        self.selector = selectors.DefaultSelector()
+        self.sockets = []
+    
+    def open(self, cookie):
+        ws = websocket.create_connection(self.url, header=[f'Cookie: {cookie}'], timeout=30)
+        assert ws.recv().startswith('0'), 'expected the Engine.IO open packet'
+        ws.send('40')
+        while not ws.recv().startswith('40'):
+            pass
+        ws.sock.setblocking(False)
+        self.selector.register(ws.sock, selectors.EVENT_READ, ws)
+        self.sockets.append(ws)
+    
+    def idle(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for key, _ in self.selector.select(timeout=max(0, deadline - time.monotonic())):
+                ws = key.data
+                ws.sock.setblocking(True)
+                try:
+                    if ws.recv() == '2':
+                        ws.send('3')
+                finally:
+                    ws.sock.setblocking(False)
+    
+    def close(self):
+        for ws in self.sockets:
+            self.selector.unregister(ws.sock)
+            ws.close()
+        self.sockets = []
+
+
+def run_mode(mode, args):
+    server = start_server(mode, args.port)
+    base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        cookies = []
+        for i in range(args.users):
+            session = requests.Session()
+            session.post(f'{base_url}/api/auth/register', json={
+                'username': f'user{i}', 'email': f'user{i}@bench.local', 'password': PASSWORD
+            }).raise_for_status()
+            cookies.append('; '.join(f'{key}={value}' for key, value in session.cookies.items()))
+    
+        sockets = IdleSockets(args.port)
+        # One connection first so lazily started background tasks are not counted per socket
+        sockets.open(cookies[0])
+        sockets.idle(1)
+        rss_before, threads_before = process_status(server.pid)
+    
+        started = time.perf_counter()
+        for i in range(args.connections - 1):
+            sockets.open(cookies[i % len(cookies)])
+            if i % 100 == 0:
+                sockets.idle(0)
+        connect_seconds = time.perf_counter() - started
+        sockets.idle(args.settle)
+        rss_after, threads_after = process_status(server.pid)
+        sockets.close()
+    finally:
+        server.terminate()
+        server.wait()
+    
+    added = args.connections - 1
+    return {
+        'connections': args.connections,
+        'rss_before_kib': rss_before,
+        'rss_after_kib': rss_after,
+        'kib_per_socket': (rss_after - rss_before) / added if added else 0.0,
+        'threads_before': threads_before,
+        'threads_after': threads_after,
+        'connects_per_s': added / connect_seconds if connect_seconds else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--modes', nargs='+', default=['threading', 'eventlet', 'gevent'])
+    parser.add_argument('--users', type=int, default=10, help='accounts the connections are spread over')
+    parser.add_argument('--settle', type=float, default=5, help='seconds the sockets sit idle before measuring')
+    parser.add_argument('--port', type=int, default=5058)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+    
+    results = {}
+    print(f"{'mode':<10} {'sockets':>8} {'RSS before':>11} {'RSS after':>10} {'KiB/socket':>11} {'threads':>13} {'connects/s':>11}")
+    for mode in args.modes:
+        if mode != 'threading' and importlib.util.find_spec(mode) is None:
+            print(f'{mode:<10} not installed')
+            continue
+        stats = results[mode] = run_mode(mode, args)
+        print(f"{mode:<10} {stats['connections']:>8} {stats['rss_before_kib'] / 1024:>9.1f}MB {stats['rss_after_kib'] / 1024:>8.1f}MB "
+              f"{stats['kib_per_socket']:>11.1f} {stats['threads_before']:>5} -> {stats['threads_after']:<5} {stats['connects_per_s']:>11.0f}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
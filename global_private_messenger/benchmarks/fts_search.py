@@ -0,0 +1,62 @@
+"""
+Full-text message search against a LIKE scan
+
+    python benchmarks/fts_search.py [--messages 2000000] [--conversations 200]
+
+Seeds synthetic messages spread over many conversations, builds the search
+index and compares GET /api/search and /api/conversations/<id>/search with
+the equivalent ilike('%term%') query over the message table.
+"""
+
+import argparse
+import random
+
+from common import load_app, create_users, login, add_messages, measure, summarize
+
+WORDS = [f'w{i:05d}' for i in range(50000)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000000)
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    messenger = load_app()
+    user_ids = create_users(messenger, 20)
+    client = login(messenger, 'user0')
+    conv_ids = [client.post('/api/conversations', json={
+        'title': f'benchmark {i}', 'is_group': True, 'members': user_ids[1:]
+    }).get_json()['id'] for i in range(args.conversations)]
+    
+    rng = random.Random(42)
+    per_conversation = args.messages // len(conv_ids)
+    for conv_id in conv_ids:
+        add_messages(messenger, conv_id, user_ids, per_conversation,
+                     content=lambda i: ' '.join(rng.choices(WORDS, k=12)))
+    with messenger.app.app_context():
+        messenger.message_search.rebuild()
+        messenger.db.session.commit()
+    
+    term = WORDS[1234]
+    like = messenger.Message.content.ilike(f'%{term}%')
+    
+    def like_scan():
+        with messenger.app.app_context():
+            messenger.Message.query.filter(like).order_by(messenger.Message.id.desc()).limit(20).all()
+    
+    scenarios = [
+        ('GET /api/search', lambda: client.get(f'/api/search?q={term}')),
+        ('GET /api/conversations/<id>/search', lambda: client.get(f'/api/conversations/{conv_ids[0]}/search?q={term}')),
+        ('LIKE scan (baseline)', like_scan)
+    ]
+    print(f'{per_conversation * len(conv_ids)} messages in {len(conv_ids)} conversations')
+    print(f"{'scenario':<38} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, fn in scenarios:
+        stats = summarize(measure(fn, args.repeat))
+        print(f"{name:<38} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Message ingest throughput: per-message commits against group commit
+
+    python benchmarks/group_commit.py [--senders 16] [--messages 200] [--batch 100]
+
+Each sender is a thread with its own session posting to one conversation.
+The same load runs with INGEST_GROUP_COMMIT off and on, followed by the bulk
+messages:batch endpoint, and reports messages per second and latency.
+"""
+
+import time
+import argparse
+import threading
+
+from common import load_app, create_users, login, summarize
+
+
+def run_senders(clients, url, per_sender):
+    durations = []
+    lock = threading.Lock()
+    
+    def send(client, sender):
+        local = []
+        for i in range(per_sender):
+            started = time.perf_counter()
+            response = client.post(url, json={'content': f'sender {sender} message {i}'})
+            local.append(time.perf_counter() - started)
+            assert response.status_code == 201, response.data
+        with lock:
+            durations.extend(local)
+    
+    threads = [threading.Thread(target=send, args=(client, n)) for n, client in enumerate(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, durations
+
+
+def report(label, elapsed, count, durations=None):
+    line = f"{label:<16} {count / elapsed:>10.0f} msg/s"
+    if durations:
+        stats = summarize(durations)
+        line += f"   p50 {stats['p50_ms']:>7.2f} ms   p99 {stats['p99_ms']:>7.2f} ms"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--senders', type=int, default=16)
+    parser.add_argument('--messages', type=int, default=200, help='messages per sender')
+    parser.add_argument('--batch', type=int, default=100, help='messages per messages:batch request')
+    args = parser.parse_args()
+    
+    messenger = load_app()
+    user_ids = create_users(messenger, args.senders)
+    clients = [login(messenger, f'user{i}') for i in range(args.senders)]
+    conv_id = clients[0].post('/api/conversations', json={
+        'title': 'benchmark', 'is_group': True, 'members': user_ids[1:]
+    }).get_json()['id']
+    url = f'/api/conversations/{conv_id}/messages'
+    total = args.senders * args.messages
+    
+    for label, enabled in (('per-message', False), ('group commit', True)):
+        messenger.app.config['INGEST_GROUP_COMMIT'] = enabled
+        elapsed, durations = run_senders(clients, url, args.messages)
+        report(label, elapsed, total, durations)
+    print(f"  writer batches: {messenger.ingest_writer.stats()}")
+    
+    body = {'messages': [{'content': f'bulk message {i}'} for i in range(args.batch)]}
+    requests = max(1, total // args.batch)
+    started = time.perf_counter()
+    for _ in range(requests):
+        assert clients[0].post(f'{url}:batch', json=body).status_code == 201
+    report('messages:batch', time.perf_counter() - started, requests * args.batch)
+
+
+if __name__ == '__main__':
+    main()
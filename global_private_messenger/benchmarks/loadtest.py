@@ -0,0 +1,377 @@
+"""
+Load test of the REST and Socket.IO paths against a real server
+
+    python benchmarks/loadtest.py [--users 200] [--conversations 50] [--members 20]
+                                  [--messages 1000] [--clients 20] [--seconds 30]
+                                  [--output results.json] [--baseline old.json]
+
+Seeds a SQLite database, starts the app with socketio.run in a child process
+and drives it over HTTP and Socket.IO with concurrent simulated users. Each
+one logs in, opens a socket and then keeps listing conversations, paging
+history, sending, reacting and typing. REST latency is measured per request.
+Socket latency is measured from the triggering call to the event arriving:
+new_message after a send, read_state after mark_read, typing_state after
+typing (this includes the TYPING_BROADCAST_INTERVAL wait) and user_joined
+after join_conversation.
+
+The database can be seeded once with --seed-only --database fixture.db and
+reused with --database fixture.db. --output writes the results as JSON, and
+--baseline compares p95 latencies against an earlier results file and exits
+with status 1 when one got slower by more than --tolerance.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+
+from common import load_app, create_users, add_messages, summarize, PASSWORD
+
+# Relative weight of each action in a simulated user's loop
+ACTIONS = {
+    'list': 20,
+    'history': 30,
+    'send': 20,
+    'react': 10,
+    'typing': 10,
+    'read': 5,
+    'join': 5
+}
+EMOJI = ['👍', '❤️', '😂', '🎉', '👀']
+
+
+def seed(messenger, args):
+    """Bulk insert users, conversations, memberships and messages"""
+    rng = random.Random(args.seed)
+    user_ids = create_users(messenger, args.users)
+    members = args.members
+    with messenger.app.app_context():
+        db = messenger.db
+        conv_members = []
+        for i in range(args.conversations):
+            # Round-robin creators so every user belongs to at least one conversation
+            creator_id = user_ids[i % len(user_ids)]
+            others = rng.sample([user_id for user_id in user_ids if user_id != creator_id], min(members, len(user_ids)) - 1)
+            conv_members.append([creator_id] + others)
+        db.session.execute(db.insert(messenger.Conversation), [{
+            'title': f'Conversation {i}',
+            'is_group': len(ids) > 2,
+            'creator_id': ids[0]
+        } for i, ids in enumerate(conv_members)])
+        db.session.commit()
+        conv_ids = [conv_id for (conv_id,) in db.session.query(messenger.Conversation.id).order_by(messenger.Conversation.id)]
+        db.session.execute(db.insert(messenger.conversation_users), [
+            {'user_id': user_id, 'conversation_id': conv_id}
+            for conv_id, ids in zip(conv_ids, conv_members) for user_id in ids
+        ])
+        db.session.commit()
+    
+    for conv_id, ids in zip(conv_ids, conv_members):
+        add_messages(messenger, conv_id, ids, args.messages, content=lambda i: f'seeded message {i} {rng.random():.6f}')
+    
+    with messenger.app.app_context():
+        messenger.recount_conversations()
+        messenger.message_search.rebuild()
+        messenger.db.session.commit()
+    return user_ids
+
+
+def serve(args):
+    """Child process: run the app on the seeded database"""
+    messenger = load_app(args.workdir, args.database)
+    messenger.socketio.run(messenger.app, host='127.0.0.1', port=args.port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+def start_server(args, database_url):
+    workdir = tempfile.mkdtemp(prefix='messenger-load-')
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(args.port),
+         '--database', database_url, '--workdir', workdir],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    import requests
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with status {process.returncode}')
+        try:
+            requests.get(f'http://127.0.0.1:{args.port}/api/conversations', timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('server did not start')
+
+
+class Recorder:
+    """Thread-safe latency samples per operation"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+    
+    def add(self, name, seconds):
+        with self.lock:
+            self.samples[name].append(seconds)
+    
+    def error(self, name):
+        with self.lock:
+            self.errors[name] += 1
+
+
+class SimulatedUser:
+    """One user with a REST session and a Socket.IO connection"""
+    
+    def __init__(self, base_url, username, recorder, rng):
+        import requests
+        self.base_url = base_url
+        self.username = username
+        self.recorder = recorder
+        self.rng = rng
+        self.http = requests.Session()
+        self.socket = None
+        self.user_id = None
+        self.conv_ids = []
+        self.message_ids = defaultdict(list)
+        self.pending = {}
+        self.sent = 0
+    
+    def request(self, name, method, path, expected=200, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=30, **kwargs)
+        except Exception:
+            self.recorder.error(name)
+            return None
+        self.recorder.add(name, time.perf_counter() - started)
+        if response.status_code != expected:
+            self.recorder.error(name)
+            return None
+        return response.json()
+    
+    def expect(self, key):
+        self.pending[key] = time.perf_counter()
+    
+    def arrived(self, name, key):
+        started = self.pending.pop(key, None)
+        if started is not None:
+            self.recorder.add(name, time.perf_counter() - started)
+    
+    def connect(self):
+        import socketio
+        data = self.request('POST /api/auth/login', 'POST', '/api/auth/login',
+                            json={'username': self.username, 'password': PASSWORD})
+        if data is None:
+            return False
+        self.user_id = data['user']['id']
+    
+        self.socket = socketio.Client(reconnection=False)
+        self.socket.on('new_message', lambda message: self.arrived('event new_message', ('send', message['content'])))
+        self.socket.on('read_state', lambda data: self.arrived('event read_state', ('read', data['conversation_id'])))
+        self.socket.on('user_joined', lambda data: data['user']['id'] == self.user_id and self.arrived('event user_joined', 'join'))
+        self.socket.on('typing_state', self.on_typing_state)
+        cookie = '; '.join(f'{key}={value}' for key, value in self.http.cookies.items())
+        started = time.perf_counter()
+        try:
+            self.socket.connect(self.base_url, headers={'Cookie': cookie}, wait_timeout=30)
+        except Exception:
+            self.recorder.error('socket connect')
+            return False
+        self.recorder.add('socket connect', time.perf_counter() - started)
+        self.list_conversations()
+        return bool(self.conv_ids)
+    
+    def on_typing_state(self, data):
+        if any(user['user_id'] == self.user_id for user in data['users']):
+            self.arrived('event typing_state', ('typing', data['conversation_id']))
+    
+    def list_conversations(self):
+        data = self.request('GET /api/conversations', 'GET', '/api/conversations')
+        if data is not None:
+            self.conv_ids = [conv['id'] for conv in data]
+    
+    def page_history(self):
+        conv_id = self.rng.choice(self.conv_ids)
+        data = self.request('GET /api/conversations/<id>/messages', 'GET',
+                            f'/api/conversations/{conv_id}/messages', params={'limit': 50})
+        if data is None:
+            return
+        self.message_ids[conv_id] = [message['id'] for message in data['messages']]
+        if data['next_cursor']:
+            self.request('GET /api/conversations/<id>/messages?before', 'GET',
+                         f'/api/conversations/{conv_id}/messages', params={'limit': 50, 'before': data['next_cursor']})
+    
+    def send(self):
+        conv_id = self.rng.choice(self.conv_ids)
+        self.sent += 1
+        content = f'load {self.username} {self.sent}'
+        self.expect(('send', content))
+        data = self.request('POST /api/conversations/<id>/messages', 'POST',
+                            f'/api/conversations/{conv_id}/messages', expected=201, json={'content': content})
+        if data is None:
+            self.pending.pop(('send', content), None)
+    
+    def react(self):
+        candidates = [conv_id for conv_id in self.conv_ids if self.message_ids[conv_id]]
+        if not candidates:
+            return self.page_history()
+        message_id = self.rng.choice(self.message_ids[self.rng.choice(candidates)])
+        self.request('POST /api/messages/<id>/react', 'POST', f'/api/messages/{message_id}/react',
+                     json={'emoji': self.rng.choice(EMOJI)})
+    
+    def emit(self, name, event, data, key):
+        self.expect(key)
+        try:
+            self.socket.emit(event, data)
+        except Exception:
+            self.pending.pop(key, None)
+            self.recorder.error(name)
+    
+    def typing(self):
+        conv_id = self.rng.choice(self.conv_ids)
+        self.emit('event typing_state', 'join_conversation', {'conversation_id': conv_id}, 'join')
+        self.emit('event typing_state', 'typing', {'conversation_id': conv_id}, ('typing', conv_id))
+    
+    def read(self):
+        conv_id = self.rng.choice(self.conv_ids)
+        self.emit('event read_state', 'mark_read', {'conversation_id': conv_id}, ('read', conv_id))
+    
+    def join(self):
+        self.emit('event user_joined', 'join_conversation', {'conversation_id': self.rng.choice(self.conv_ids)}, 'join')
+    
+    def run(self, stop):
+        actions = {
+            'list': self.list_conversations,
+            'history': self.page_history,
+            'send': self.send,
+            'react': self.react,
+            'typing': self.typing,
+            'read': self.read,
+            'join': self.join
+        }
+        names, weights = list(ACTIONS), list(ACTIONS.values())
+        while time.perf_counter() < stop:
+            actions[self.rng.choices(names, weights)[0]]()
+    
+    def close(self):
+        if self.socket is not None:
+            self.socket.disconnect()
+
+
+def run_load(args, base_url):
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    users = [SimulatedUser(base_url, f'user{i}', recorder, random.Random(rng.random()))
+             for i in rng.sample(range(args.users), min(args.clients, args.users))]
+    connected = [user for user in users if user.connect()]
+    
+    started = time.perf_counter()
+    stop = started + args.seconds
+    threads = [threading.Thread(target=user.run, args=(stop,)) for user in connected]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    # Give events triggered in the last moments a chance to arrive
+    time.sleep(1)
+    for user in connected:
+        user.close()
+    
+    operations = {}
+    for name in sorted(set(recorder.samples) | set(recorder.errors)):
+        stats = summarize(recorder.samples[name])
+        stats['throughput_per_s'] = len(recorder.samples[name]) / elapsed
+        stats['errors'] = recorder.errors[name]
+        operations[name] = stats
+    return {
+        'config': {key: getattr(args, key) for key in ('users', 'conversations', 'members', 'messages', 'clients', 'seconds', 'seed')},
+        'connected_clients': len(connected),
+        'elapsed_s': elapsed,
+        'operations': operations
+    }
+
+
+def compare(results, baseline, tolerance):
+    """p95 regressions against a baseline results file"""
+    regressions = []
+    for name, stats in results['operations'].items():
+        previous = baseline['operations'].get(name)
+        if previous and previous['count'] and stats['count'] and stats['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append((name, previous['p95_ms'], stats['p95_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--conversations', type=int, default=50)
+    parser.add_argument('--members', type=int, default=20, help='members per conversation')
+    parser.add_argument('--messages', type=int, default=1000, help='seeded messages per conversation')
+    parser.add_argument('--clients', type=int, default=20, help='concurrent simulated users')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1, help='random seed for data and actions')
+    parser.add_argument('--port', type=int, default=5057)
+    parser.add_argument('--database', help='SQLite file to seed or reuse instead of a temporary one')
+    parser.add_argument('--seed-only', action='store_true', help='seed --database and exit')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='results JSON to compare p95 latencies against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown against the baseline')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.serve:
+        return serve(args)
+    # load_app changes into a temporary directory, so resolve paths first
+    for name in ('database', 'output', 'baseline'):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    
+    if args.database and os.path.exists(args.database) and not args.seed_only:
+        database_url = f'sqlite:///{args.database}'
+    else:
+        path = args.database or os.path.join(tempfile.mkdtemp(prefix='messenger-load-'), 'load.db')
+        database_url = f'sqlite:///{path}'
+        started = time.perf_counter()
+        messenger = load_app(database_url=database_url)
+        seed(messenger, args)
+        print(f'seeded {args.users} users, {args.conversations} conversations and '
+              f'{args.conversations * args.messages} messages in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+        if args.seed_only:
+            return
+    
+    server = start_server(args, database_url)
+    try:
+        results = run_load(args, f'http://127.0.0.1:{args.port}')
+    finally:
+        server.terminate()
+        server.wait()
+    
+    print(f"{'operation':<50} {'count':>7} {'per s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+    for name, stats in results['operations'].items():
+        print(f"{name:<50} {stats['count']:>7} {stats['throughput_per_s']:>8.1f} {stats['p50_ms']:>7.1f}ms "
+              f"{stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms {stats['errors']:>7}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, before, after in regressions:
+            print(f'regression: {name} p95 {before:.1f}ms -> {after:.1f}ms', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
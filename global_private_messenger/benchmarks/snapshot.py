@@ -0,0 +1,41 @@
+"""
+Conversation snapshot latency as history grows
+
+    python benchmarks/snapshot.py [--sizes 1000 10000 100000] [--repeat 20]
+
+GET /api/conversations/<id> returns a bounded snapshot, so its latency and
+payload size should stay flat while the number of stored messages grows.
+"""
+
+import argparse
+
+from common import load_app, create_users, login, add_messages, measure, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    messenger = load_app()
+    user_ids = create_users(messenger, args.members)
+    client = login(messenger, 'user0')
+    conv_id = client.post('/api/conversations', json={
+        'title': 'benchmark', 'is_group': True, 'members': user_ids[1:]
+    }).get_json()['id']
+    url = f'/api/conversations/{conv_id}'
+    
+    print(f"{'messages':>10} {'p50 ms':>8} {'p95 ms':>8} {'bytes':>10}")
+    stored = 0
+    for size in sorted(args.sizes):
+        add_messages(messenger, conv_id, user_ids, size - stored)
+        stored = size
+        payload = len(client.get(url).data)
+        stats = summarize(measure(lambda: client.get(url), args.repeat))
+        print(f"{size:>10} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {payload:>10}")
+
+
+if __name__ == '__main__':
+    main()
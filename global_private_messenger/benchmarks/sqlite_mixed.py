@@ -0,0 +1,90 @@
+"""
+Mixed read/write load with and without the SQLite tuning profile
+
+    python benchmarks/sqlite_mixed.py [--readers 8] [--writers 4] [--seconds 10]
+
+Reader threads load the conversation list and message history while writer
+threads keep sending messages. Each profile runs in its own process, because
+the engine options are fixed when the app is imported.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+
+from common import load_app, create_users, login, add_messages, summarize
+
+
+def run_profile(args):
+    messenger = load_app()
+    user_ids = create_users(messenger, args.readers + args.writers)
+    clients = [login(messenger, f'user{i}') for i in range(len(user_ids))]
+    conv_id = clients[0].post('/api/conversations', json={
+        'title': 'benchmark', 'is_group': True, 'members': user_ids[1:]
+    }).get_json()['id']
+    add_messages(messenger, conv_id, user_ids, 5000)
+    
+    stop = time.perf_counter() + args.seconds
+    results = {'read': [], 'write': [], 'errors': 0}
+    lock = threading.Lock()
+    
+    def worker(client, kind):
+        local, errors = [], 0
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            if kind == 'read':
+                ok = client.get('/api/conversations').status_code == 200 and \
+                    client.get(f'/api/conversations/{conv_id}/messages?limit=50').status_code == 200
+            else:
+                ok = client.post(f'/api/conversations/{conv_id}/messages', json={'content': 'load'}).status_code == 201
+            local.append(time.perf_counter() - started)
+            errors += not ok
+        with lock:
+            results[kind].extend(local)
+            results['errors'] += errors
+    
+    kinds = ['read'] * args.readers + ['write'] * args.writers
+    threads = [threading.Thread(target=worker, args=(client, kind)) for client, kind in zip(clients, kinds)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    print(json.dumps({
+        'read': summarize(results['read']),
+        'write': summarize(results['write']),
+        'errors': results['errors']
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profile', choices=['default', 'tuned'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.profile:
+        return run_profile(args)
+    
+    print(f"{'profile':<8} {'reads/s':>8} {'read p50':>9} {'read p99':>9} {'writes/s':>9} {'write p99':>10} {'errors':>7}")
+    for profile in ('default', 'tuned'):
+        env = dict(os.environ, SQLITE_TUNED='true' if profile == 'tuned' else 'false')
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--profile', profile,
+             '--readers', str(args.readers), '--writers', str(args.writers), '--seconds', str(args.seconds)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        stats = json.loads(output.strip().splitlines()[-1])
+        read, write = stats['read'], stats['write']
+        print(f"{profile:<8} {read['count'] / args.seconds:>8.0f} {read['p50_ms']:>8.1f}ms {read['p99_ms']:>8.1f}ms "
+              f"{write['count'] / args.seconds:>9.0f} {write['p99_ms']:>9.1f}ms {stats['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
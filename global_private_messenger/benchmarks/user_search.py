@@ -0,0 +1,46 @@
+"""
+User search: in-memory prefix/trigram index against the ilike query
+
+    python benchmarks/user_search.py [--users 1000000] [--repeat 200]
+
+Times UserSearchIndex.search() and the previous
+username/display_name ilike('%q%') query for a few query shapes.
+"""
+
+import argparse
+import time
+
+from common import load_app, create_users, measure, summarize
+
+QUERIES = ['user12', 'user999999', 'User 4242', 'er77', '4242']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    
+    messenger = load_app()
+    create_users(messenger, args.users)
+    User = messenger.User
+    
+    with messenger.app.app_context():
+        started = time.perf_counter()
+        messenger.sync_user_index()
+        print(f'{args.users} users, index built in {time.perf_counter() - started:.1f}s')
+        
+        def ilike(query):
+            User.query.filter(
+                (User.username.ilike(f'%{query}%')) | (User.display_name.ilike(f'%{query}%'))
+            ).limit(20).all()
+        
+        print(f"{'query':<12} {'index p50 ms':>13} {'index p99 ms':>13} {'ilike p50 ms':>13}")
+        for query in QUERIES:
+            index = summarize(measure(lambda: messenger.user_index.search(query, limit=20), args.repeat))
+            scan = summarize(measure(lambda: ilike(query), max(1, args.repeat // 20)))
+            print(f"{query:<12} {index['p50_ms']:>13.3f} {index['p99_ms']:>13.3f} {scan['p50_ms']:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
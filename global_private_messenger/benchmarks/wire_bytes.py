@@ -0,0 +1,59 @@
+"""
+Bytes on the wire per reaction and edit in a large group
+
+    python benchmarks/wire_bytes.py [--members 1000] [--reactions 8]
+
+Captures the Socket.IO packets a room member receives for one reaction and
+one edit, with the compact reaction_delta/message_patch events alone and with
+FULL_MESSAGE_EVENTS also sending the full message_reacted/message_edited
+payloads, then scales the per-recipient bytes by the group size.
+"""
+
+import argparse
+
+from socketio import packet
+
+from common import load_app, create_users, login
+
+
+def packet_bytes(received):
+    """Encoded size of the event packets a test client received"""
+    return sum(len(packet.Packet(packet.EVENT, data=[event['name']] + event['args']).encode()) for event in received)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--members', type=int, default=1000)
+    parser.add_argument('--reactions', type=int, default=8, help='distinct emoji already on the message')
+    args = parser.parse_args()
+    
+    messenger = load_app()
+    user_ids = create_users(messenger, args.members)
+    client = login(messenger, 'user0')
+    conv_id = client.post('/api/conversations', json={
+        'title': 'benchmark', 'is_group': True, 'members': user_ids[1:]
+    }).get_json()['id']
+    msg_id = client.post(f'/api/conversations/{conv_id}/messages', json={
+        'content': 'a message everyone reacts to'
+    }).get_json()['id']
+    for i in range(args.reactions):
+        client.post(f'/api/messages/{msg_id}/react', json={'emoji': chr(0x1F600 + i)})
+    
+    listener = messenger.socketio.test_client(messenger.app, flask_test_client=login(messenger, 'user1'))
+    listener.emit('join_conversation', {'conversation_id': conv_id})
+    
+    print(f"{'mode':<8} {'event':<10} {'bytes/recipient':>16} {'bytes/group':>13}")
+    for mode, full in (('full', True), ('delta', False)):
+        messenger.app.config['FULL_MESSAGE_EVENTS'] = full
+        for event, send in (
+            ('reaction', lambda: client.post(f'/api/messages/{msg_id}/react', json={'emoji': chr(0x1F600)})),
+            ('edit', lambda: client.put(f'/api/messages/{msg_id}', json={'content': 'edited message text'}))
+        ):
+            listener.get_received()
+            send()
+            size = packet_bytes(listener.get_received())
+            print(f"{mode:<8} {event:<10} {size:>16} {size * args.members:>13}")
+
+
+if __name__ == '__main__':
+    main()
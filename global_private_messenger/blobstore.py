@@ -0,0 +1,66 @@
+"""
+Content-addressed storage for uploaded files
+
+Each distinct file is stored once under blobs/<aa>/<bb>/<sha256>, where aa
+and bb are the first two byte pairs of the digest, so no directory grows
+beyond a few thousand entries. Reference counts live in the database; this
+module only moves bytes around.
+"""
+
+import os
+import re
+import secrets
+import time
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class BlobStore:
+    """Immutable files addressed by their SHA-256 digest"""
+    
+    def __init__(self, root):
+        self.root = os.path.abspath(os.path.join(root, 'blobs'))
+        self.tmp = os.path.join(self.root, 'tmp')
+        os.makedirs(self.tmp, exist_ok=True)
+    
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+    
+    def exists(self, digest):
+        return os.path.isfile(self.path(digest))
+    
+    def temp_path(self):
+        """A fresh path on the same filesystem for bytes whose digest is not known yet"""
+        return os.path.join(self.tmp, secrets.token_hex(16))
+    
+    def put(self, source, digest):
+        """Move source into place, or drop it when the same content is already stored"""
+        target = self.path(digest)
+        if os.path.isfile(target):
+            os.unlink(source)
+            return target
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+        return target
+    
+    def delete(self, digest):
+        try:
+            os.unlink(self.path(digest))
+        except FileNotFoundError:
+            pass
+    
+    def stored_digests(self, older_than=0):
+        """Digests of stored files, and stray temp files, last modified more than older_than seconds ago"""
+        cutoff = time.time() - older_than
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                except OSError:
+                    continue
+                if directory == self.tmp:
+                    os.unlink(path)
+                elif DIGEST_RE.match(name):
+                    yield name
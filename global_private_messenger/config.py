@@ -1,111 +1,205 @@
-# config.py
-
-import os
-from datetime import timedelta
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class Config:
-    """Base configuration"""
-    
-    # Flask
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
-    TESTING = False
-    
-    # Database
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///messenger.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
-    # File Upload
-    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
-    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 52428800))  # 50MB
-    
-    ALLOWED_EXTENSIONS = {
-        'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 
-        'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar',
-        'mp3', 'mp4', 'avi', 'mov', 'webm'
-    }
-    
-    # Session
-    PERMANENT_SESSION_LIFETIME = timedelta(days=30)
-    SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'True').lower() == 'true'
-    SESSION_COOKIE_HTTPONLY = os.environ.get('SESSION_COOKIE_HTTPONLY', 'True').lower() == 'true'
-    SESSION_COOKIE_SAMESITE = os.environ.get('SESSION_COOKIE_SAMESITE', 'Lax')
-    
-    # CORS
-    CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*')
-    
-    # Security
-    JSONIFY_PRETTYPRINT_REGULAR = False
-    JSON_SORT_KEYS = False
-    
-    # Logging
-    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
-    LOG_FILE = os.environ.get('LOG_FILE', 'logs/app.log')
-    
-    # Rate Limiting
-    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True').lower() == 'true'
-    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
-    RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT', '100/hour')
-    
-    # Features
-    ENABLE_FILE_SHARING = os.environ.get('ENABLE_FILE_SHARING', 'True').lower() == 'true'
-    ENABLE_NOTIFICATIONS = os.environ.get('ENABLE_NOTIFICATIONS', 'True').lower() == 'true'
-
-
-class DevelopmentConfig(Config):
-    """Development configuration"""
-    DEBUG = True
-    TESTING = False
-    SESSION_COOKIE_SECURE = False
-
-
-class TestingConfig(Config):
-    """Testing configuration"""
-    TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
-    SESSION_COOKIE_SECURE = False
-    WTF_CSRF_ENABLED = False
-
-
-class ProductionConfig(Config):
-    """Production configuration"""
-    DEBUG = False
-    TESTING = False
-    SESSION_COOKIE_SECURE = True
-    
-    @classmethod
-    def init_app(cls, app):
-        """Production-specific initialization"""
-        Config.init_app(app)
-        
-        # Log errors
-        import logging
-        from logging.handlers import RotatingFileHandler
-        
-        if not app.debug and not app.testing:
-            if not os.path.exists('logs'):
-                os.mkdir('logs')
-            
-            file_handler = RotatingFileHandler(
-                'logs/messenger.log',
-                maxBytes=10240000,
-                backupCount=10
-            )
-            file_handler.setFormatter(logging.Formatter(
-                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-            ))
-            file_handler.setLevel(logging.INFO)
-            app.logger.addHandler(file_handler)
-            app.logger.setLevel(logging.INFO)
-            app.logger.info('Web Messenger startup')
-
-
-config = {
-    'development': DevelopmentConfig,
-    'testing': TestingConfig,
-    'production': ProductionConfig,
-    'default': DevelopmentConfig
-}
+# config.py
+
+import os
+from datetime import timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class Config:
+    """Base configuration"""
+    
+    # Flask
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+    DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
+    TESTING = False
+    
+    # Database
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///messenger.db'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # SQLite tuning (file databases only, see sqlite_tuning.py): WAL journaling,
+    # a pool of read connections and a single writer connection
+    SQLITE_TUNED = os.environ.get('SQLITE_TUNED', 'True').lower() == 'true'
+    SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE', 8))
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms to wait on another process's lock
+    SQLITE_WRITER_TIMEOUT = int(os.environ.get('SQLITE_WRITER_TIMEOUT', 30))  # seconds to wait for the writer connection
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', 65536))  # KiB of page cache per connection
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))  # 256MB
+    
+    # File Upload
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 52428800))  # 50MB
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 536870912))  # 512MB, chunked uploads
+    
+    # File serving: 'direct' streams from the app, 'x-sendfile' (Apache, lighttpd)
+    # and 'x-accel-redirect' (nginx) hand the file to the front proxy
+    UPLOAD_SERVE_MODE = os.environ.get('UPLOAD_SERVE_MODE', 'direct')
+    UPLOAD_ACCEL_PREFIX = os.environ.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads')  # internal location aliased to UPLOAD_FOLDER
+    UPLOAD_CACHE_MAX_AGE = int(os.environ.get('UPLOAD_CACHE_MAX_AGE', 31536000))
+    MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', 2))  # threads resizing images; needs Pillow
+    
+    ALLOWED_EXTENSIONS = {
+        'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 
+        'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar',
+        'mp3', 'mp4', 'avi', 'mov', 'webm'
+    }
+    
+    # Conversation snapshots
+    SNAPSHOT_MESSAGE_LIMIT = int(os.environ.get('SNAPSHOT_MESSAGE_LIMIT', 50))
+    SNAPSHOT_MEMBER_LIMIT = int(os.environ.get('SNAPSHOT_MEMBER_LIMIT', 100))
+    
+    # Membership cache (per worker process)
+    MEMBERSHIP_CACHE_SIZE = int(os.environ.get('MEMBERSHIP_CACHE_SIZE', 100000))
+    MEMBERSHIP_CACHE_TTL = int(os.environ.get('MEMBERSHIP_CACHE_TTL', 30))
+    
+    # Serialized user profile cache (per worker process)
+    PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 50000))
+    PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 60))
+    
+    # Session
+    PERMANENT_SESSION_LIFETIME = timedelta(days=30)
+    SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'True').lower() == 'true'
+    SESSION_COOKIE_HTTPONLY = os.environ.get('SESSION_COOKIE_HTTPONLY', 'True').lower() == 'true'
+    SESSION_COOKIE_SAMESITE = os.environ.get('SESSION_COOKIE_SAMESITE', 'Lax')
+    
+    # CORS
+    CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*')
+    
+    # Authenticated user identity cache used by load_user (per worker process)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 50000))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+    
+    # Seconds between checks for users registered on other workers
+    USER_INDEX_SYNC_INTERVAL = int(os.environ.get('USER_INDEX_SYNC_INTERVAL', 5))
+    
+    # Message ingest: group-commit send_message writes in batches of up to
+    # INGEST_MAX_BATCH rows, waiting at most INGEST_MAX_DELAY seconds to fill one
+    INGEST_GROUP_COMMIT = os.environ.get('INGEST_GROUP_COMMIT', '').lower() in ('1', 'true', 'yes')
+    INGEST_MAX_BATCH = int(os.environ.get('INGEST_MAX_BATCH', 256))
+    INGEST_MAX_DELAY = float(os.environ.get('INGEST_MAX_DELAY', 0.002))
+    MESSAGE_BATCH_LIMIT = int(os.environ.get('MESSAGE_BATCH_LIMIT', 500))  # per messages:batch request
+    
+    # Sync change log: seconds of history kept by `flask compact-changes`, and the
+    # most changes /api/sync returns before answering with a full snapshot instead
+    SYNC_LOG_RETENTION = int(os.environ.get('SYNC_LOG_RETENTION', 7 * 24 * 3600))
+    SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', 1000))
+    
+    # Also send the full message_edited/message_reacted payloads (and return full
+    # messages from the edit and react routes) for clients that predate the
+    # message_patch/reaction_delta events
+    FULL_MESSAGE_EVENTS = os.environ.get('FULL_MESSAGE_EVENTS', 'False').lower() == 'true'
+    
+    # Socket.IO server concurrency: threading (an OS thread per client), eventlet
+    # or gevent (green threads; start through wsgi.py, which patches the standard
+    # library before the app is imported)
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+    HOST = os.environ.get('HOST', '0.0.0.0')  # for `python wsgi.py`
+    PORT = int(os.environ.get('PORT', 5000))
+    
+    # Socket.IO fan-out between workers (see socket_queue.py for the URL formats)
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+    
+    # Recipients handled per step when delivering new_message to a large group
+    FANOUT_CHUNK_SIZE = int(os.environ.get('FANOUT_CHUNK_SIZE', 1000))
+    
+    # Presence: seconds before a disconnected user is reported offline,
+    # and seconds between batched status/last_seen writes
+    PRESENCE_GRACE_PERIOD = int(os.environ.get('PRESENCE_GRACE_PERIOD', 5))
+    PRESENCE_FLUSH_INTERVAL = int(os.environ.get('PRESENCE_FLUSH_INTERVAL', 10))
+    
+    # Typing indicators: seconds between typing_state broadcasts, minimum
+    # seconds between accepted signals per user, and entry lifetime
+    TYPING_BROADCAST_INTERVAL = float(os.environ.get('TYPING_BROADCAST_INTERVAL', 0.5))
+    TYPING_MIN_INTERVAL = float(os.environ.get('TYPING_MIN_INTERVAL', 2))
+    TYPING_TTL = float(os.environ.get('TYPING_TTL', 6))
+    
+    # Instrumentation: /metrics in Prometheus text format, and a warning with the
+    # slowest SQL statements for requests and events over METRICS_SLOW_REQUEST_MS
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # if set, scrapers send "Authorization: Bearer <token>"; required in production
+    METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS', 500))
+    
+    # Security
+    JSONIFY_PRETTYPRINT_REGULAR = False
+    JSON_SORT_KEYS = False
+    
+    # Logging
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FILE = os.environ.get('LOG_FILE', 'logs/app.log')
+    
+    # Rate Limiting
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True').lower() == 'true'
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+    RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT', '100/hour')
+    
+    # Features
+    ENABLE_FILE_SHARING = os.environ.get('ENABLE_FILE_SHARING', 'True').lower() == 'true'
+    ENABLE_NOTIFICATIONS = os.environ.get('ENABLE_NOTIFICATIONS', 'True').lower() == 'true'
+
+
+    @staticmethod
+    def init_app(app):
+        """Hook for configuration-specific setup once the app is created"""
+        pass
+
+
+class DevelopmentConfig(Config):
+    """Development configuration"""
+    DEBUG = True
+    TESTING = False
+    SESSION_COOKIE_SECURE = False
+
+
+class TestingConfig(Config):
+    """Testing configuration"""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SESSION_COOKIE_SECURE = False
+    WTF_CSRF_ENABLED = False
+
+
+class ProductionConfig(Config):
+    """Production configuration"""
+    DEBUG = False
+    TESTING = False
+    SESSION_COOKIE_SECURE = True
+    
+    @classmethod
+    def init_app(cls, app):
+        """Production-specific initialization"""
+        Config.init_app(app)
+        
+        # Metrics expose routes, SQL timings and user counts; never serve them unauthenticated
+        if app.config['METRICS_ENABLED'] and not app.config['METRICS_TOKEN']:
+            app.config['METRICS_ENABLED'] = False
+            app.logger.warning('METRICS_TOKEN is not set, /metrics is disabled')
+        
+        # Log errors
+        import logging
+        from logging.handlers import RotatingFileHandler
+        
+        if not app.debug and not app.testing:
+            if not os.path.exists('logs'):
+                os.mkdir('logs')
+            
+            file_handler = RotatingFileHandler(
+                'logs/messenger.log',
+                maxBytes=10240000,
+                backupCount=10
+            )
+            file_handler.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+            ))
+            file_handler.setLevel(logging.INFO)
+            app.logger.addHandler(file_handler)
+            app.logger.setLevel(logging.INFO)
+            app.logger.info('Web Messenger startup')
+
+
+config = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+    'default': DevelopmentConfig
+}
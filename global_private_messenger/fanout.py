@@ -0,0 +1,23 @@
+"""
+Delivery of events to every member of a conversation
+
+Each member's sockets sit in a personal room (user_<id>), so an event reaches
+members whether or not they have the conversation open. For a large group
+the rooms are handed to emit() in chunks, yielding to other green threads
+and requests between chunks.
+"""
+
+
+class FanOut:
+    """Sends one event to the personal rooms of many users"""
+    
+    def __init__(self, socketio, chunk_size=1000, namespace='/'):
+        self.socketio = socketio
+        self.chunk_size = chunk_size
+        self.namespace = namespace
+    
+    def emit_to_users(self, event, data, user_ids):
+        rooms = [f'user_{user_id}' for user_id in user_ids]
+        for start in range(0, len(rooms), self.chunk_size):
+            self.socketio.emit(event, data, to=rooms[start:start + self.chunk_size], namespace=self.namespace)
+            self.socketio.sleep(0)
@@ -0,0 +1,80 @@
+"""
+Group commit for message writes
+
+Request threads hand their rows to a single writer, which commits whatever
+has queued up (bounded by max_batch rows or max_delay seconds) in one
+transaction. On SQLite this turns one fsync per message into one per batch
+and keeps writers from queueing on the database lock.
+"""
+
+import time
+import queue
+from concurrent import futures
+
+
+class GroupCommitWriter:
+    """Queue of pending writes drained by one background writer"""
+    
+    def __init__(self, commit, max_batch=256, max_delay=0.002):
+        # commit(items) writes all items in one transaction and returns one result per item
+        self._commit = commit
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+    
+    def submit(self, item, timeout=30):
+        """Queue item and block until its batch is committed, returning its result
+        
+        Raises TimeoutError when the writer has not picked the item up within
+        timeout seconds; the item is then dropped, never written later.
+        """
+        future = futures.Future()
+        self._queue.put((item, future))
+        try:
+            return future.result(timeout)
+        except futures.TimeoutError:
+            if future.cancel():
+                raise TimeoutError(f'Not picked up by the writer within {timeout}s') from None
+            # Already in a batch being committed, which decides the outcome
+            return future.result()
+    
+    def run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            # Skips items whose sender timed out; the rest can no longer be cancelled
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                self._flush(batch)
+    
+    def _flush(self, batch):
+        try:
+            results = self._commit([item for item, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # Retry one by one so a single bad row only fails its own sender
+            for entry in batch:
+                self._flush([entry])
+            return
+        
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+    
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch': self.items / self.batches if self.batches else 0.0,
+            'queued': self._queue.qsize()
+        }
@@ -0,0 +1,119 @@
+"""
+Background image processing for uploads
+
+Decoding and resizing run in a small thread pool so upload requests return as
+soon as the file is stored. Under eventlet or gevent the work is handed to
+their native thread pool from a green task instead, so it neither blocks the
+event loop nor runs the callback outside of it. Pillow is optional: without it no variants are
+produced and /uploads/<name>?variant=... keeps serving the original.
+"""
+
+import os
+import logging
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+# Variant name -> (bounding box, crop to fill it)
+VARIANTS = {
+    'thumb': ((320, 320), False),
+    'avatar': ((128, 128), True),
+}
+
+EXIF_ORIENTATION = 0x0112
+
+
+def is_image(filename):
+    return '.' in (filename or '') and filename.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS
+
+
+def media_key(filename):
+    """Variants are keyed by the upload name without its extension"""
+    return filename.split('.', 1)[0]
+
+
+class MediaPipeline:
+    """Generates resized JPEG variants of uploaded images off the request thread"""
+    
+    def __init__(self, root, workers=2, spawn=None, run_native=None):
+        # spawn(fn, *args) starts a green task and run_native(fn, *args) runs fn on a
+        # native thread; both are given together in eventlet/gevent mode
+        self.root = os.path.abspath(os.path.join(root, 'variants'))
+        self.enabled = Image is not None
+        self._executor = None
+        self._spawn = spawn
+        self._run_native = run_native
+        if self.enabled:
+            os.makedirs(self.root, exist_ok=True)
+            if spawn is None:
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media')
+    
+    def variant_path(self, key, variant):
+        return os.path.join(self.root, key[:2], f'{key}.{variant}.jpg')
+    
+    def has_variant(self, key, variant):
+        return variant in VARIANTS and os.path.isfile(self.variant_path(key, variant))
+    
+    def submit(self, source, key, variants, callback):
+        """Queue source for processing; callback(width, height) runs on the worker afterwards"""
+        if not self.enabled:
+            return None
+        if self._spawn is not None:
+            return self._spawn(self._run, source, key, variants, callback)
+        return self._executor.submit(self._run, source, key, variants, callback)
+    
+    def remove(self, key):
+        for variant in VARIANTS:
+            try:
+                os.unlink(self.variant_path(key, variant))
+            except FileNotFoundError:
+                pass
+    
+    def _run(self, source, key, variants, callback):
+        try:
+            if self._run_native is not None:
+                width, height = self._run_native(self._process, source, key, variants)
+            else:
+                width, height = self._process(source, key, variants)
+            callback(width, height)
+        except Exception:
+            logger.exception('Could not process image %s', source)
+    
+    def _process(self, source, key, variants):
+        """Render the missing variants and return the upright image size"""
+        with Image.open(source) as image:
+            width, height = image.size
+            if image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+                width, height = height, width
+            
+            pending = [v for v in variants if not self.has_variant(key, v)]
+            if pending:
+                # Let the JPEG decoder downscale while reading instead of decoding every pixel
+                largest = max(max(VARIANTS[v][0]) for v in pending)
+                image.draft('RGB', (largest * 2, largest * 2))
+                upright = ImageOps.exif_transpose(image)
+                for variant in pending:
+                    self._render(upright, self.variant_path(key, variant), *VARIANTS[variant])
+        return width, height
+    
+    def _render(self, image, path, size, crop):
+        if crop:
+            resized = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+        if resized.mode != 'RGB':
+            resized = resized.convert('RGB')
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{secrets.token_hex(4)}.tmp'
+        resized.save(temp_path, 'JPEG', quality=82, optimize=True)
+        os.replace(temp_path, path)
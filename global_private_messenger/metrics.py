@@ -0,0 +1,240 @@
+"""
+Request, Socket.IO event and SQL instrumentation in Prometheus text format
+
+Latencies go into fixed-bucket histograms keyed by route or event name, so an
+observation is a bisect and a few additions under a lock. SQL statements are
+counted through SQLAlchemy engine events and charged to the request or event
+running in the current context; statements issued by background workers only
+show up in the process-wide totals. Gauges are callbacks evaluated at scrape
+time. Every worker process keeps its own numbers.
+"""
+
+import time
+import heapq
+import bisect
+import threading
+from functools import wraps
+from contextvars import ContextVar
+
+from flask import g, request
+from sqlalchemy import event
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Statements per request or event
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+_scope = ContextVar('metrics_scope', default=None)
+
+
+class Scope:
+    """SQL accounting for one request or event"""
+    
+    __slots__ = ('queries', 'sql_seconds', 'slowest')
+    
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest = []  # min-heap of (seconds, statement)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations"""
+    
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Registry of histograms, counters and gauge callbacks for one process"""
+    
+    def __init__(self, logger, prefix='messenger', slow_threshold=0.5, slow_statements=5):
+        self.logger = logger
+        self.prefix = prefix
+        self.slow_threshold = slow_threshold  # seconds before a request or event is logged
+        self.slow_statements = slow_statements  # slowest statements kept per request for that log line
+        self._lock = threading.Lock()
+        self._meta = {}        # name -> (type, help, label names)
+        self._histograms = {}  # (name, label values) -> Histogram
+        self._counters = {}    # (name, label values) -> number
+        self._callbacks = []   # (name, fn) with fn() -> number or {label values: number}
+    
+        self.describe('http_request_duration_seconds', 'histogram', 'HTTP request latency', ('route', 'method'))
+        self.describe('http_requests_total', 'counter', 'HTTP requests by status', ('route', 'method', 'status'))
+        self.describe('http_request_sql_queries', 'histogram', 'SQL statements per HTTP request', ('route', 'method'))
+        self.describe('http_request_sql_seconds_total', 'counter', 'Time spent in SQL by HTTP requests', ('route', 'method'))
+        self.describe('socketio_event_duration_seconds', 'histogram', 'Socket.IO event handler latency', ('event',))
+        self.describe('socketio_event_sql_queries', 'histogram', 'SQL statements per Socket.IO event', ('event',))
+        self.describe('socketio_event_sql_seconds_total', 'counter', 'Time spent in SQL by Socket.IO events', ('event',))
+        self.describe('slow_total', 'counter', 'Requests and events slower than the slow threshold', ('kind',))
+        self.describe('sql_queries_total', 'counter', 'SQL statements executed by this process', ())
+        self.describe('sql_seconds_total', 'counter', 'Time spent in SQL by this process', ())
+    
+    def describe(self, name, kind, documentation, labels=()):
+        self._meta[name] = (kind, documentation, tuple(labels))
+    
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+    
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+    
+    def register(self, name, kind, documentation, fn, labels=()):
+        """Report fn() at scrape time; fn returns a number, or {label values: number} with labels"""
+        self.describe(name, kind, documentation, labels)
+        self._callbacks.append((name, fn))
+    
+    # Scopes
+    def begin(self):
+        return _scope.set(Scope())
+    
+    def end(self, token):
+        scope = _scope.get()
+        _scope.reset(token)
+        return scope
+    
+    def _finish(self, kind, labels, elapsed, scope, description):
+        duration, queries, sql_seconds = {
+            'http': ('http_request_duration_seconds', 'http_request_sql_queries', 'http_request_sql_seconds_total'),
+            'event': ('socketio_event_duration_seconds', 'socketio_event_sql_queries', 'socketio_event_sql_seconds_total')
+        }[kind]
+        self.observe(duration, labels, elapsed)
+        self.observe(queries, labels, scope.queries, QUERY_BUCKETS)
+        self.inc(sql_seconds, labels, scope.sql_seconds)
+        if elapsed >= self.slow_threshold:
+            self.inc('slow_total', (kind,))
+            statements = ''.join(
+                f'\n  {seconds * 1000:.1f}ms {" ".join(statement.split())[:300]}'
+                for seconds, statement in sorted(scope.slowest, reverse=True)
+            )
+            self.logger.warning('Slow %s %s took %.0fms with %d SQL statements (%.0fms in SQL)%s',
+                                kind, description, elapsed * 1000, scope.queries, scope.sql_seconds * 1000, statements)
+    
+    # SQLAlchemy
+    def instrument_engines(self, app, db):
+        """Count statements on every engine of the app, including the SQLite writer"""
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._counters[('sql_queries_total', ())] = self._counters.get(('sql_queries_total', ()), 0) + 1
+            self._counters[('sql_seconds_total', ())] = self._counters.get(('sql_seconds_total', ()), 0) + elapsed
+        scope = _scope.get()
+        if scope is not None:
+            scope.queries += 1
+            scope.sql_seconds += elapsed
+            if len(scope.slowest) < self.slow_statements:
+                heapq.heappush(scope.slowest, (elapsed, statement))
+            elif elapsed > scope.slowest[0][0]:
+                heapq.heapreplace(scope.slowest, (elapsed, statement))
+    
+    # Flask
+    def instrument_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+    
+    def _before_request(self):
+        g._metrics = (time.perf_counter(), self.begin())
+    
+    def _after_request(self, response):
+        started, token = g.pop('_metrics', (None, None))
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        scope = self.end(token)
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        self.inc('http_requests_total', (route, request.method, response.status_code))
+        self._finish('http', (route, request.method), elapsed, scope, f'{request.method} {request.path} {response.status_code}')
+        return response
+    
+    # Socket.IO
+    def instrument_socketio(self, socketio):
+        """Time every event socketio dispatches, whether its handler is registered before or after this call"""
+        handle_event = socketio._handle_event
+        
+        @wraps(handle_event)
+        def timed_handle_event(handler, message, *args):
+            started = time.perf_counter()
+            token = self.begin()
+            try:
+                return handle_event(handler, message, *args)
+            finally:
+                elapsed = time.perf_counter() - started
+                self._finish('event', (message,), elapsed, self.end(token), message)
+        socketio._handle_event = timed_handle_event
+    
+    # Exposition
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append((labels, value))
+        for name, fn in self._callbacks:
+            try:
+                value = fn()
+            except Exception:
+                self.logger.exception('Metric %s failed', name)
+                continue
+            samples[name] = list(value.items()) if isinstance(value, dict) else [((), value)]
+        for (name, labels) in histograms:
+            samples.setdefault(name, [])
+    
+        lines = []
+        for name in sorted(samples):
+            kind, documentation, label_names = self._meta[name]
+            full_name = f'{self.prefix}_{name}'
+            lines.append(f'# HELP {full_name} {documentation}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            if kind != 'histogram':
+                for labels, value in sorted(samples[name], key=lambda sample: tuple(map(str, sample[0]))):
+                    lines.append(f'{full_name}{_labels(label_names, labels)} {_number(value)}')
+                continue
+            for (hist_name, labels), (counts, total, count, buckets) in sorted(
+                    histograms.items(), key=lambda item: tuple(map(str, item[0][1]))):
+                if hist_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{full_name}_bucket{_labels(label_names + ("le",), labels + (bound,))} {cumulative}')
+                lines.append(f'{full_name}_sum{_labels(label_names, labels)} {_number(total)}')
+                lines.append(f'{full_name}_count{_labels(label_names, labels)} {count}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,72 @@
+"""
+In-memory presence tracking
+
+Connections are counted per user inside the worker process. A user goes
+offline only after their last socket has been gone for a grace period, so a
+flapping connection never produces status changes, and status/last_seen
+updates are handed out in batches for the application to write back.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+
+class PresenceTracker:
+    """Online state per user with debounced offline transitions"""
+    
+    def __init__(self, grace_period=5):
+        self.grace_period = grace_period
+        self._lock = threading.Lock()
+        self._sockets = {}          # user_id -> set of socket ids
+        self._pending_offline = {}  # user_id -> monotonic deadline
+        self._dirty = {}            # user_id -> (status, last_seen) not yet written
+    
+    def connect(self, user_id, sid):
+        """Register a socket, returning True if the user has just come online"""
+        with self._lock:
+            sids = self._sockets.setdefault(user_id, set())
+            came_online = not sids and self._pending_offline.pop(user_id, None) is None
+            sids.add(sid)
+            self._dirty[user_id] = ('online', datetime.utcnow())
+            return came_online
+    
+    def disconnect(self, user_id, sid):
+        """Forget a socket; the last one starts the user's grace period"""
+        with self._lock:
+            sids = self._sockets.get(user_id)
+            if sids is None:
+                return
+            sids.discard(sid)
+            if not sids:
+                del self._sockets[user_id]
+                self._pending_offline[user_id] = time.monotonic() + self.grace_period
+                self._dirty[user_id] = ('online', datetime.utcnow())
+    
+    def expire(self):
+        """Users whose grace period has run out, who are now offline"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [user_id for user_id, deadline in self._pending_offline.items() if deadline <= now]
+            for user_id in expired:
+                del self._pending_offline[user_id]
+                self._dirty[user_id] = ('offline', datetime.utcnow())
+            return expired
+    
+    def take_dirty(self):
+        """Hand over pending {user_id: (status, last_seen)} writes"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            return dirty
+    
+    def is_online(self, user_id):
+        with self._lock:
+            return user_id in self._sockets or user_id in self._pending_offline
+    
+    def online_users(self):
+        with self._lock:
+            return len(self._sockets)
+    
+    def connected_sockets(self):
+        with self._lock:
+            return sum(len(sids) for sids in self._sockets.values())
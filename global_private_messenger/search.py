@@ -0,0 +1,109 @@
+"""
+Full-text search over message content
+
+SQLite keeps an FTS5 table, message_fts, whose rowid is the message id. The
+application updates it in the same transaction as the message itself when
+messages are sent, edited and deleted. PostgreSQL searches message.content
+through a GIN expression index on its tsvector, which the database keeps
+current on its own. Other databases fall back to a LIKE scan.
+"""
+
+import re
+
+from sqlalchemy import text
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query or '')[:16]
+
+
+class MessageSearch:
+    """Ranked, paginated message search scoped by conversation or member"""
+    
+    def __init__(self, db):
+        self.db = db
+    
+    @property
+    def dialect(self):
+        return self.db.engine.dialect.name
+    
+    def create_schema(self):
+        """Create the search structures, indexing existing messages on first use"""
+        if self.dialect == 'sqlite':
+            exists = self.db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_fts'"
+            )).first()
+            if not exists:
+                self.db.session.execute(text(
+                    "CREATE VIRTUAL TABLE message_fts USING fts5("
+                    "content, conversation_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+                ))
+                self.rebuild()
+        elif self.dialect == 'postgresql':
+            self.db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_message_content_tsv ON message "
+                "USING GIN (to_tsvector('simple', coalesce(content, '')))"
+            ))
+        self.db.session.commit()
+    
+    def rebuild(self):
+        if self.dialect != 'sqlite':
+            return
+        self.db.session.execute(text('DELETE FROM message_fts'))
+        self.db.session.execute(text(
+            'INSERT INTO message_fts (rowid, content, conversation_id) '
+            "SELECT id, content, conversation_id FROM message WHERE NOT is_deleted AND content != ''"
+        ))
+    
+    def index(self, message):
+        """Add or refresh one message; call before the surrounding commit"""
+        if self.dialect != 'sqlite':
+            return
+        self.remove(message.id)
+        if message.content and not message.is_deleted:
+            self.db.session.execute(text(
+                'INSERT INTO message_fts (rowid, content, conversation_id) VALUES (:id, :content, :conv_id)'
+            ), {'id': message.id, 'content': message.content, 'conv_id': message.conversation_id})
+    
+    def remove(self, message_id):
+        if self.dialect == 'sqlite':
+            self.db.session.execute(text('DELETE FROM message_fts WHERE rowid = :id'), {'id': message_id})
+    
+    def search(self, query, conversation_id=None, user_id=None, page=1, per_page=20):
+        """Message ids ranked best first, and whether another page exists
+        
+        Pass conversation_id to search one conversation or user_id to search
+        every conversation the user belongs to.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return [], False
+        
+        params = {'limit': per_page + 1, 'offset': (page - 1) * per_page}
+        if conversation_id is not None:
+            scope = 'conversation_id = :conv_id'
+            params['conv_id'] = conversation_id
+        else:
+            scope = 'conversation_id IN (SELECT conversation_id FROM conversation_users WHERE user_id = :user_id)'
+            params['user_id'] = user_id
+        
+        if self.dialect == 'sqlite':
+            # Quote every token so user input can never be read as FTS5 syntax; the last one matches as a prefix
+            params['match'] = ' '.join('"%s"' % t for t in tokens[:-1]) + ' "%s"*' % tokens[-1]
+            sql = (f'SELECT rowid FROM message_fts WHERE message_fts MATCH :match AND {scope} '
+                   'ORDER BY bm25(message_fts), rowid DESC LIMIT :limit OFFSET :offset')
+        elif self.dialect == 'postgresql':
+            params['tsquery'] = ' & '.join(tokens) + ':*'
+            sql = ("SELECT id FROM message, to_tsquery('simple', :tsquery) AS q "
+                   f"WHERE to_tsvector('simple', coalesce(content, '')) @@ q AND NOT is_deleted AND {scope} "
+                   "ORDER BY ts_rank(to_tsvector('simple', coalesce(content, '')), q) DESC, id DESC "
+                   'LIMIT :limit OFFSET :offset')
+        else:
+            params['pattern'] = '%' + '%'.join(tokens) + '%'
+            sql = (f'SELECT id FROM message WHERE content LIKE :pattern AND NOT is_deleted AND {scope} '
+                   'ORDER BY id DESC LIMIT :limit OFFSET :offset')
+        
+        ids = [row[0] for row in self.db.session.execute(text(sql), params)]
+        return ids[:per_page], len(ids) > per_page
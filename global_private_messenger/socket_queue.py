@@ -0,0 +1,80 @@
+"""
+Message queue backends for fanning Socket.IO emits out across workers
+
+SOCKETIO_MESSAGE_QUEUE selects the backend:
+
+- empty: no queue, emits only reach clients of the emitting process
+- redis://, rediss://, kafka://, zmq+..., amqp:// and other kombu URLs:
+  handled by the managers that ship with python-socketio
+- local:///path/to/dir: LocalSocketManager below, for several workers on
+  one host without any external service
+"""
+
+import os
+import atexit
+import pickle
+import socket
+from urllib.parse import urlparse
+
+import socketio
+
+# Linux rejects larger Unix datagrams with the default socket buffers
+MAX_DATAGRAM_SIZE = 200 * 1024
+
+
+class LocalSocketManager(socketio.PubSubManager):
+    """Pub/sub over Unix datagram sockets that live in a shared directory
+    
+    Every worker binds one socket in the directory and publishes by sending
+    the message to each socket found there, its own included, which is the
+    delivery PubSubManager expects from a broker.
+    """
+    name = 'local'
+    
+    def __init__(self, url='local:///tmp/messenger-socketio', channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.directory = os.path.join(urlparse(url).path or '/tmp/messenger-socketio', channel)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self.address = os.path.join(self.directory, f'{os.getpid()}-{self.host_id[:12]}.sock')
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    
+    def _publish(self, data):
+        payload = pickle.dumps(data)
+        if len(payload) > MAX_DATAGRAM_SIZE:
+            self._get_logger().error('Dropping %d byte queue message, larger than %d bytes',
+                                     len(payload), MAX_DATAGRAM_SIZE)
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith('.sock'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                self.sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket left behind by a worker that exited without cleaning up
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+    
+    def _listen(self):
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(self.address)
+        atexit.register(self._cleanup)
+        while True:
+            yield pickle.loads(receiver.recv(MAX_DATAGRAM_SIZE))
+    
+    def _cleanup(self):
+        try:
+            os.unlink(self.address)
+        except OSError:
+            pass
+
+
+def queue_options(url, channel='flask-socketio'):
+    """Keyword arguments for SocketIO() that enable the configured queue"""
+    if not url:
+        return {}
+    if url.startswith('local://'):
+        return {'client_manager': LocalSocketManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
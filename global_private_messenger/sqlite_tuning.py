@@ -0,0 +1,106 @@
+"""
+Tuned connection handling for file-backed SQLite databases
+
+WAL journaling lets readers run while a write is in progress, and
+synchronous=NORMAL drops the fsync from every commit (a power loss can only
+lose the last transactions, never corrupt the file). The cache and mmap
+settings keep hot pages in memory. Reads use a pool of connections. Every
+write goes through a single writer connection, so concurrent writers queue in
+the pool instead of spinning on SQLITE_BUSY.
+"""
+
+from functools import partial
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+from flask_sqlalchemy.session import Session
+
+from async_mode import is_green
+
+WRITER_BIND = 'writer'
+READ_STATEMENTS = {'SELECT', 'WITH', 'PRAGMA', 'EXPLAIN'}
+
+
+def is_file_database(uri):
+    return uri.startswith('sqlite:') and ':memory:' not in uri and uri.rstrip('/') != 'sqlite:'
+
+
+def is_write(clause):
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        words = clause.text.split(None, 1)
+        return bool(words) and words[0].upper() not in READ_STATEMENTS
+    return False
+
+
+class RoutingSession(Session):
+    """Reads from the default engine until the first write, then stays on the writer until the transaction ends"""
+    
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self.writing = False
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (self.writing or self._flushing or is_write(clause)):
+            self.writing = True
+            return self._db.engines[WRITER_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _release_writer(session, transaction):
+    if transaction.parent is None:
+        session.writing = False
+
+
+def configure_sqlite(app):
+    """Add pool options and the writer bind to app.config; returns session_options for SQLAlchemy()"""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite:') and not is_file_database(uri) and is_green(app.config.get('SOCKETIO_ASYNC_MODE')):
+        # The default pool for in-memory SQLite holds a connection, and so a separate
+        # empty database, per thread ident, which under green threads means per client
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        options.setdefault('poolclass', StaticPool)
+        options.setdefault('connect_args', {}).setdefault('check_same_thread', False)
+        return {}
+    if not app.config.get('SQLITE_TUNED') or not is_file_database(uri):
+        return {}
+    
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    options.setdefault('pool_size', app.config['SQLITE_READ_POOL_SIZE'])
+    options.setdefault('connect_args', {}).setdefault('timeout', app.config['SQLITE_BUSY_TIMEOUT'] / 1000)
+    app.config.setdefault('SQLALCHEMY_BINDS', {})[WRITER_BIND] = {
+        'url': uri,
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': app.config['SQLITE_WRITER_TIMEOUT']
+    }
+    return {'class_': RoutingSession}
+
+
+def install_pragmas(app, db):
+    """Apply the tuning pragmas to every new connection of the app's SQLite engines"""
+    if not app.config.get('SQLITE_TUNED'):
+        return
+    pragmas = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': app.config['SQLITE_BUSY_TIMEOUT'],
+        'cache_size': -app.config['SQLITE_CACHE_SIZE'],  # negative values are KiB
+        'mmap_size': app.config['SQLITE_MMAP_SIZE'],
+        'temp_store': 'MEMORY'
+    }
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite' and is_file_database(str(engine.url)):
+                event.listen(engine, 'connect', partial(_apply_pragmas, pragmas))
+
+
+def _apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
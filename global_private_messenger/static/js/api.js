@@ -1,228 +1,273 @@
-// static/js/api.js
-
-const API = {
-    baseURL: '/api',
-    token: null,
-
-    setToken(token) {
-        this.token = token;
-        localStorage.setItem('auth_token', token);
-    },
-
-    getToken() {
-        return this.token || localStorage.getItem('auth_token');
-    },
-
-    async request(endpoint, options = {}) {
-        const url = `${this.baseURL}${endpoint}`;
-        const headers = {
-            'Content-Type': 'application/json',
-            ...options.headers
-        };
-
-        if (this.getToken()) {
-            headers['Authorization'] = `Bearer ${this.getToken()}`;
-        }
-
-        try {
-            const response = await fetch(url, {
-                ...options,
-                headers
-            });
-
-            if (response.status === 401) {
-                this.token = null;
-                localStorage.removeItem('auth_token');
-                window.location.reload();
-            }
-
-            const data = response.ok ? await response.json() : await response.text();
-
-            if (!response.ok) {
-                throw {
-                    status: response.status,
-                    message: typeof data === 'object' ? data.error : data
-                };
-            }
-
-            return data;
-        } catch (error) {
-            console.error('API Error:', error);
-            throw error;
-        }
-    },
-
-    // Authentication
-    auth: {
-        register(username, email, password, displayName) {
-            return API.request('/auth/register', {
-                method: 'POST',
-                body: JSON.stringify({
-                    username,
-                    email,
-                    password,
-                    display_name: displayName
-                })
-            });
-        },
-
-        login(username, password) {
-            return API.request('/auth/login', {
-                method: 'POST',
-                body: JSON.stringify({ username, password })
-            });
-        },
-
-        logout() {
-            return API.request('/auth/logout', { method: 'POST' });
-        },
-
-        getCurrentUser() {
-            return API.request('/auth/me');
-        }
-    },
-
-    // Users
-    users: {
-        getUser(username) {
-            return API.request(`/users/${username}`);
-        },
-
-        search(query) {
-            return API.request(`/users/search/${encodeURIComponent(query)}`);
-        },
-
-        updateProfile(userId, data) {
-            return API.request(`/users/${userId}/profile`, {
-                method: 'PUT',
-                body: JSON.stringify(data)
-            });
-        },
-
-        uploadAvatar(userId, file) {
-            const formData = new FormData();
-            formData.append('file', file);
-            return API.request(`/users/${userId}/avatar`, {
-                method: 'POST',
-                body: formData,
-                headers: {}
-            });
-        }
-    },
-
-    // Conversations
-    conversations: {
-        getAll() {
-            return API.request('/conversations');
-        },
-
-        get(convId, includeMessages = false) {
-            return API.request(`/conversations/${convId}?include_messages=${includeMessages}`);
-        },
-
-        create(title, description = '', isGroup = false, members = []) {
-            return API.request('/conversations', {
-                method: 'POST',
-                body: JSON.stringify({
-                    title,
-                    description,
-                    is_group: isGroup,
-                    members
-                })
-            });
-        },
-
-        update(convId, data) {
-            return API.request(`/conversations/${convId}`, {
-                method: 'PUT',
-                body: JSON.stringify(data)
-            });
-        },
-
-        addMember(convId, userId) {
-            return API.request(`/conversations/${convId}/members`, {
-                method: 'POST',
-                body: JSON.stringify({ user_id: userId })
-            });
-        },
-
-        removeMember(convId, memberId) {
-            return API.request(`/conversations/${convId}/members/${memberId}`, {
-                method: 'DELETE'
-            });
-        }
-    },
-
-    // Messages
-    messages: {
-        getMessages(convId, page = 1, perPage = 50) {
-            return API.request(
-                `/conversations/${convId}/messages?page=${page}&per_page=${perPage}`
-            );
-        },
-
-        send(convId, content, type = 'text') {
-            return API.request(`/conversations/${convId}/messages`, {
-                method: 'POST',
-                body: JSON.stringify({
-                    content,
-                    message_type: type
-                })
-            });
-        },
-
-        update(msgId, content) {
-            return API.request(`/messages/${msgId}`, {
-                method: 'PUT',
-                body: JSON.stringify({ content })
-            });
-        },
-
-        delete(msgId) {
-            return API.request(`/messages/${msgId}`, {
-                method: 'DELETE'
-            });
-        },
-
-        uploadFile(msgId, file) {
-            const formData = new FormData();
-            formData.append('file', file);
-            return API.request(`/messages/${msgId}/file`, {
-                method: 'POST',
-                body: formData,
-                headers: {}
-            });
-        },
-
-        addReaction(msgId, emoji) {
-            return API.request(`/messages/${msgId}/react`, {
-                method: 'POST',
-                body: JSON.stringify({ emoji })
-            });
-        }
-    },
-
-    // Contacts
-    contacts: {
-        getAll() {
-            return API.request('/contacts');
-        },
-
-        add(contactId, contactName = '') {
-            return API.request('/contacts', {
-                method: 'POST',
-                body: JSON.stringify({
-                    contact_id: contactId,
-                    contact_name: contactName
-                })
-            });
-        },
-
-        delete(contactId) {
-            return API.request(`/contacts/${contactId}`, {
-                method: 'DELETE'
-            });
-        }
-    }
-};
-
+// static/js/api.js
+
+const API = {
+    baseURL: '/api',
+    token: null,
+
+    setToken(token) {
+        this.token = token;
+        localStorage.setItem('auth_token', token);
+    },
+
+    getToken() {
+        return this.token || localStorage.getItem('auth_token');
+    },
+
+    async request(endpoint, options = {}) {
+        const url = `${this.baseURL}${endpoint}`;
+        const headers = {
+            'Content-Type': 'application/json',
+            ...options.headers
+        };
+
+        if (this.getToken()) {
+            headers['Authorization'] = `Bearer ${this.getToken()}`;
+        }
+
+        try {
+            const response = await fetch(url, {
+                ...options,
+                headers
+            });
+
+            if (response.status === 401) {
+                this.token = null;
+                localStorage.removeItem('auth_token');
+                window.location.reload();
+            }
+
+            const data = response.ok ? await response.json() : await response.text();
+
+            if (!response.ok) {
+                throw {
+                    status: response.status,
+                    message: typeof data === 'object' ? data.error : data
+                };
+            }
+
+            return data;
+        } catch (error) {
+            console.error('API Error:', error);
+            throw error;
+        }
+    },
+
+    // Authentication
+    auth: {
+        register(username, email, password, displayName) {
+            return API.request('/auth/register', {
+                method: 'POST',
+                body: JSON.stringify({
+                    username,
+                    email,
+                    password,
+                    display_name: displayName
+                })
+            });
+        },
+
+        login(username, password) {
+            return API.request('/auth/login', {
+                method: 'POST',
+                body: JSON.stringify({ username, password })
+            });
+        },
+
+        logout() {
+            return API.request('/auth/logout', { method: 'POST' });
+        },
+
+        getCurrentUser() {
+            return API.request('/auth/me');
+        }
+    },
+
+    // Users
+    users: {
+        getUser(username) {
+            return API.request(`/users/${username}`);
+        },
+
+        search(query) {
+            return API.request(`/users/search/${encodeURIComponent(query)}`);
+        },
+
+        updateProfile(userId, data) {
+            return API.request(`/users/${userId}/profile`, {
+                method: 'PUT',
+                body: JSON.stringify(data)
+            });
+        },
+
+        uploadAvatar(userId, file) {
+            const formData = new FormData();
+            formData.append('file', file);
+            return API.request(`/users/${userId}/avatar`, {
+                method: 'POST',
+                body: formData,
+                headers: {}
+            });
+        }
+    },
+
+    // Conversations
+    conversations: {
+        getAll() {
+            return API.request('/conversations');
+        },
+
+        get(convId, includeMessages = false) {
+            return API.request(`/conversations/${convId}?include_messages=${includeMessages}`);
+        },
+
+        create(title, description = '', isGroup = false, members = []) {
+            return API.request('/conversations', {
+                method: 'POST',
+                body: JSON.stringify({
+                    title,
+                    description,
+                    is_group: isGroup,
+                    members
+                })
+            });
+        },
+
+        update(convId, data) {
+            return API.request(`/conversations/${convId}`, {
+                method: 'PUT',
+                body: JSON.stringify(data)
+            });
+        },
+
+        addMember(convId, userId) {
+            return API.request(`/conversations/${convId}/members`, {
+                method: 'POST',
+                body: JSON.stringify({ user_id: userId })
+            });
+        },
+
+        removeMember(convId, memberId) {
+            return API.request(`/conversations/${convId}/members/${memberId}`, {
+                method: 'DELETE'
+            });
+        }
+    },
+
+    // Messages
+    messages: {
+        getMessages(convId, page = 1, perPage = 50) {
+            return API.request(
+                `/conversations/${convId}/messages?page=${page}&per_page=${perPage}`
+            );
+        },
+
+        getHistory(convId, { before = null, after = null, limit = 50 } = {}) {
+            const params = new URLSearchParams({ limit });
+            if (before) params.set('before', before);
+            if (after) params.set('after', after);
+            return API.request(`/conversations/${convId}/messages?${params}`);
+        },
+
+        send(convId, content, type = 'text') {
+            return API.request(`/conversations/${convId}/messages`, {
+                method: 'POST',
+                body: JSON.stringify({
+                    content,
+                    message_type: type
+                })
+            });
+        },
+
+        update(msgId, content) {
+            return API.request(`/messages/${msgId}`, {
+                method: 'PUT',
+                body: JSON.stringify({ content })
+            });
+        },
+
+        delete(msgId) {
+            return API.request(`/messages/${msgId}`, {
+                method: 'DELETE'
+            });
+        },
+
+        async uploadFile(msgId, file, chunkSize = 1024 * 1024) {
+            // Hashing lets the server skip the transfer when it already has the content
+            const sha256 = file.size <= 64 * 1024 * 1024 ? await API.messages.sha256(file) : null;
+            const upload = await API.request('/uploads', {
+                method: 'POST',
+                body: JSON.stringify({ message_id: msgId, filename: file.name, size: file.size, sha256 })
+            });
+            if (upload.complete) return upload.message;
+
+            let received = upload.received;
+            let retries = 0;
+            while (received < file.size) {
+                const end = Math.min(received + chunkSize, file.size);
+                try {
+                    const status = await API.request(`/uploads/${upload.upload_id}`, {
+                        method: 'PUT',
+                        body: file.slice(received, end),
+                        headers: {
+                            'Content-Type': 'application/octet-stream',
+                            'Content-Range': `bytes ${received}-${end - 1}/${file.size}`
+                        }
+                    });
+                    received = status.received;
+                    retries = 0;
+                } catch (error) {
+                    if (++retries > 3) throw error;
+                    // Resume from what the server actually stored
+                    received = (await API.request(`/uploads/${upload.upload_id}`)).received;
+                }
+            }
+
+            return API.request(`/uploads/${upload.upload_id}/commit`, {
+                method: 'POST',
+                body: JSON.stringify({ sha256 })
+            });
+        },
+
+        async sha256(file) {
+            if (!window.crypto || !crypto.subtle) return null;
+            const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+            return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+        },
+
+        addReaction(msgId, emoji) {
+            return API.request(`/messages/${msgId}/react`, {
+                method: 'POST',
+                body: JSON.stringify({ emoji })
+            });
+        }
+    },
+
+    // Changes since a sync sequence number (0 for a full snapshot)
+    sync(since = 0) {
+        return API.request(`/sync?since=${since}`);
+    },
+
+    // Contacts
+    contacts: {
+        getAll() {
+            return API.request('/contacts');
+        },
+
+        add(contactId, contactName = '') {
+            return API.request('/contacts', {
+                method: 'POST',
+                body: JSON.stringify({
+                    contact_id: contactId,
+                    contact_name: contactName
+                })
+            });
+        },
+
+        delete(contactId) {
+            return API.request(`/contacts/${contactId}`, {
+                method: 'DELETE'
+            });
+        }
+    }
+};
+
@@ -0,0 +1,72 @@
+"""
+Shared fixtures: the application bound to a throwaway SQLite database
+
+app.py reads its configuration at import time, so the database URL and the
+working directory (for the uploads folder) are set before it is imported.
+"""
+
+import os
+import sys
+import itertools
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='messenger-test-')
+PASSWORD = 'test-password'
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+os.environ.pop('SOCKETIO_MESSAGE_QUEUE', None)
+os.chdir(WORKDIR)
+sys.path.insert(0, ROOT)
+
+_usernames = itertools.count()
+
+
+@pytest.fixture(scope='session')
+def messenger():
+    import app as messenger
+    with messenger.app.app_context():
+        messenger.init_db()
+    return messenger
+
+
+@pytest.fixture
+def make_user(messenger):
+    """Register a fresh user and return (logged-in test client, user id)"""
+    def make_user():
+        username = f'user{next(_usernames)}'
+        client = messenger.app.test_client()
+        response = client.post('/api/auth/register', json={
+            'username': username, 'email': f'{username}@test.local', 'password': PASSWORD
+        })
+        assert response.status_code == 201, response.data
+        return client, response.get_json()['user']['id']
+    return make_user
+
+
+@pytest.fixture
+def count_queries(messenger):
+    """Context manager counting the SQL statements run on every engine of the app"""
+    class QueryCounter:
+        def __init__(self):
+            self.count = 0
+        
+        def _count(self, *args):
+            self.count += 1
+        
+        def __enter__(self):
+            with messenger.app.app_context():
+                self.engines = list(messenger.db.engines.values())
+            for engine in self.engines:
+                event.listen(engine, 'before_cursor_execute', self._count)
+            return self
+        
+        def __exit__(self, *exc):
+            for engine in self.engines:
+                event.remove(engine, 'before_cursor_execute', self._count)
+    
+    return QueryCounter
@@ -0,0 +1,36 @@
+"""GET /api/conversations runs a fixed number of queries"""
+
+# Conversations, members, read state and last messages; the user and profile caches are warm
+QUERY_CEILING = 6
+
+
+def conversation_list_queries(make_user, count_queries, conversations, members):
+    client, user_id = make_user()
+    others = [make_user()[1] for _ in range(members)]
+    for i in range(conversations):
+        response = client.post('/api/conversations', json={'title': f'chat {i}', 'members': others})
+        assert response.status_code == 201
+        conv_id = response.get_json()['id']
+        client.post(f'/api/conversations/{conv_id}/messages', json={'content': f'hello {i}'})
+    
+    # Warm the per-process user and profile caches, then measure
+    assert client.get('/api/conversations').status_code == 200
+    with count_queries() as counter:
+        response = client.get('/api/conversations')
+    assert response.status_code == 200
+    assert len(response.get_json()) == conversations
+    return counter.count
+
+
+def test_query_count_does_not_grow_with_conversations(make_user, count_queries):
+    few = conversation_list_queries(make_user, count_queries, conversations=3, members=2)
+    many = conversation_list_queries(make_user, count_queries, conversations=30, members=2)
+    assert many == few
+    assert many <= QUERY_CEILING
+
+
+def test_query_count_does_not_grow_with_members(make_user, count_queries):
+    small = conversation_list_queries(make_user, count_queries, conversations=3, members=1)
+    large = conversation_list_queries(make_user, count_queries, conversations=3, members=12)
+    assert large == small
+    assert large <= QUERY_CEILING
@@ -0,0 +1,36 @@
+"""A send that times out waiting for the group-commit writer is never written"""
+
+import threading
+
+import pytest
+
+from ingest import GroupCommitWriter
+
+
+def test_timed_out_items_are_dropped():
+    started, release = threading.Event(), threading.Event()
+    committed = []
+    
+    def slow_commit(items):
+        started.set()
+        release.wait(5)
+        committed.extend(items)
+        return items
+    
+    writer = GroupCommitWriter(slow_commit, max_delay=0)
+    threading.Thread(target=writer.run, daemon=True).start()
+    
+    # The first item holds the writer in its commit while the second one waits in the queue
+    first = []
+    sender = threading.Thread(target=lambda: first.append(writer.submit('first', timeout=0.05)))
+    sender.start()
+    assert started.wait(5)
+    with pytest.raises(TimeoutError):
+        writer.submit('second', timeout=0.1)
+    
+    release.set()
+    sender.join(5)
+    writer.submit('third', timeout=5)
+    # The writer was already committing the first item, so its sender got the result despite the timeout
+    assert first == ['first']
+    assert committed == ['first', 'third']
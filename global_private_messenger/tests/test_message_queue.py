@@ -0,0 +1,126 @@
+"""Cross-worker Socket.IO delivery through the local:// message queue"""
+
+import os
+import sys
+import time
+import socket
+import subprocess
+
+import pytest
+
+from conftest import ROOT, PASSWORD
+
+requests = pytest.importorskip('requests')
+socketio = pytest.importorskip('socketio')
+
+WORKERS = 3
+MESSAGES = 5
+
+WORKER = """
+import sys
+sys.path.insert(0, {root!r})
+import app
+with app.app.app_context():
+    app.init_db()
+app.socketio.run(app.app, host='127.0.0.1', port={port}, allow_unsafe_werkzeug=True, log_output=False,
+                 use_reloader=False)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(predicate, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.1)
+    return predicate()
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Base URLs of several app processes sharing one database and one local queue"""
+    queue_dir = tmp_path / 'queue'
+    queue_dir.mkdir()
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{tmp_path / 'workers.db'}",
+               SOCKETIO_MESSAGE_QUEUE=f'local://{queue_dir}',
+               SOCKETIO_ASYNC_MODE='threading',
+               SESSION_COOKIE_SECURE='false',
+               FLASK_ENV='development')
+    processes, urls = [], []
+    try:
+        # One at a time, so only the first worker creates the schema
+        for _ in range(WORKERS):
+            port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, '-c', WORKER.format(root=ROOT, port=port)], cwd=tmp_path, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            ))
+            url = f'http://127.0.0.1:{port}'
+            assert wait_until(lambda: responds(url)), 'worker did not start'
+            urls.append(url)
+        yield urls
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+def responds(url):
+    try:
+        requests.get(url + '/', timeout=1)
+        return True
+    except requests.RequestException:
+        return False
+
+
+def test_every_member_receives_each_emit_exactly_once(workers):
+    sessions = []
+    for i, url in enumerate(workers):
+        session = requests.Session()
+        response = session.post(f'{url}/api/auth/register', json={
+            'username': f'worker-user{i}', 'email': f'worker-user{i}@test.local', 'password': PASSWORD
+        })
+        assert response.status_code == 201
+        sessions.append((session, response.json()['user']['id'], url))
+    
+    sender, _, sender_url = sessions[0]
+    conv_id = sender.post(f'{sender_url}/api/conversations', json={
+        'title': 'workers', 'is_group': True, 'members': [user_id for _, user_id, _ in sessions[1:]]
+    }).json()['id']
+    
+    # One client per worker; new_message goes through the personal rooms and
+    # reaction_delta through the conversation room
+    received = [{'new_message': [], 'reaction_delta': []} for _ in sessions]
+    clients = []
+    try:
+        for events, (session, _, url) in zip(received, sessions):
+            client = socketio.Client(reconnection=False)
+            client.on('new_message', lambda message, events=events: events['new_message'].append(message['id']))
+            client.on('reaction_delta', lambda delta, events=events: events['reaction_delta'].append(delta['count']))
+            cookie = '; '.join(f'{key}={value}' for key, value in session.cookies.items())
+            client.connect(url, headers={'Cookie': cookie}, wait_timeout=10)
+            client.emit('join_conversation', {'conversation_id': conv_id})
+            clients.append(client)
+        time.sleep(1)
+        
+        sent = [sender.post(f'{sender_url}/api/conversations/{conv_id}/messages', json={'content': f'message {i}'}).json()['id']
+                for i in range(MESSAGES)]
+        for _ in range(MESSAGES):
+            sender.post(f'{sender_url}/api/messages/{sent[0]}/react', json={'emoji': '👍'})
+        
+        expected = {'new_message': sent, 'reaction_delta': list(range(1, MESSAGES + 1))}
+        wait_until(lambda: all(len(events['new_message']) >= MESSAGES and len(events['reaction_delta']) >= MESSAGES
+                               for events in received))
+        time.sleep(0.5)  # duplicates would arrive about as late as the originals
+        for events in received:
+            assert events == expected
+    finally:
+        for client in clients:
+            client.disconnect()
@@ -0,0 +1,33 @@
+"""Socket.IO handlers are timed whenever they are registered, and production needs a token for /metrics"""
+
+
+def test_handler_registered_late_is_timed(messenger, make_user):
+    @messenger.socketio.on('metrics_probe')
+    def metrics_probe(data):
+        return 'ok'
+    
+    client, _ = make_user()
+    socket = messenger.socketio.test_client(messenger.app, flask_test_client=client)
+    assert socket.emit('metrics_probe', {}, callback=True) == 'ok'
+    
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'messenger_socketio_event_duration_seconds_count{event="metrics_probe"} 1' in text.splitlines()
+
+
+def test_socketio_dispatch_hook_exists(messenger):
+    # instrument_socketio wraps this private method; if Flask-SocketIO renames it, events stop being timed
+    from flask_socketio import SocketIO
+    assert callable(getattr(SocketIO, '_handle_event', None))
+    assert messenger.socketio._handle_event.__wrapped__.__func__ is SocketIO._handle_event
+
+
+def test_production_requires_a_metrics_token(messenger):
+    from flask import Flask
+    from config import ProductionConfig
+    
+    for token, enabled in (('', False), ('scrape-token', True)):
+        app = Flask('production')
+        app.config.from_object(ProductionConfig)
+        app.config.update(METRICS_ENABLED=True, METRICS_TOKEN=token, DEBUG=True)
+        ProductionConfig.init_app(app)
+        assert app.config['METRICS_ENABLED'] is enabled
@@ -0,0 +1,38 @@
+"""Reaction counters under concurrent updates"""
+
+import threading
+
+THREADS = 8
+REACTIONS_PER_THREAD = 50
+EMOJI = ['👍', '🎉']
+
+
+def test_parallel_reactions_are_not_lost(messenger, make_user):
+    clients = [make_user() for _ in range(THREADS)]
+    owner, _ = clients[0]
+    conv_id = owner.post('/api/conversations', json={
+        'title': 'reactions', 'is_group': True, 'members': [user_id for _, user_id in clients[1:]]
+    }).get_json()['id']
+    msg_id = owner.post(f'/api/conversations/{conv_id}/messages', json={'content': 'react to me'}).get_json()['id']
+    
+    start = threading.Barrier(THREADS)
+    failures = []
+    
+    def react(client):
+        start.wait()
+        for i in range(REACTIONS_PER_THREAD):
+            response = client.post(f'/api/messages/{msg_id}/react', json={'emoji': EMOJI[i % len(EMOJI)]})
+            if response.status_code != 200:
+                failures.append(response.status_code)
+    
+    threads = [threading.Thread(target=react, args=(client,)) for client, _ in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert failures == []
+    with messenger.app.app_context():
+        counts = dict(messenger.db.session.query(messenger.Reaction.emoji, messenger.Reaction.count).filter_by(message_id=msg_id))
+    expected = THREADS * REACTIONS_PER_THREAD // len(EMOJI)
+    assert counts == {emoji: expected for emoji in EMOJI}
@@ -0,0 +1,69 @@
+"""Unread counts follow sends, reads and deletes, and sending does not touch other members"""
+
+from sqlalchemy import event
+
+
+def create_group(client, members):
+    response = client.post('/api/conversations', json={'title': 'group', 'is_group': True, 'members': members})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def send(client, conv_id, content):
+    response = client.post(f'/api/conversations/{conv_id}/messages', json={'content': content})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def unread(client, conv_id):
+    entry = next(conv for conv in client.get('/api/conversations').get_json() if conv['id'] == conv_id)
+    return entry['unread_count']
+
+
+def test_unread_counts(messenger, make_user):
+    reader, reader_id = make_user()
+    sender, sender_id = make_user()
+    conv_id = create_group(reader, [sender_id])
+    
+    first, second, _ = (send(sender, conv_id, f'message {i}') for i in range(3))
+    assert unread(reader, conv_id) == 3
+    assert unread(sender, conv_id) == 0
+    
+    with messenger.app.app_context():
+        assert messenger.mark_read(conv_id, reader_id, first) == (first, 2)
+    
+    # One message the reader had not seen and one they had
+    assert sender.delete(f'/api/messages/{second}').status_code == 200
+    assert unread(reader, conv_id) == 1
+    assert sender.delete(f'/api/messages/{first}').status_code == 200
+    assert unread(reader, conv_id) == 1
+    assert unread(sender, conv_id) == 0
+    
+    reply = send(reader, conv_id, 'reply')
+    assert unread(reader, conv_id) == 0
+    assert unread(sender, conv_id) == 1
+    
+    with messenger.app.app_context():
+        assert messenger.mark_read(conv_id, sender_id) == (reply, 0)
+
+
+def test_send_updates_only_the_sender_row(messenger, make_user):
+    client, _ = make_user()
+    conv_id = create_group(client, [make_user()[1] for _ in range(30)])
+    send(client, conv_id, 'warm up')
+    
+    updated = []
+    def count_member_rows(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('UPDATE CONVERSATION_USERS'):
+            updated.append(cursor.rowcount)
+    
+    with messenger.app.app_context():
+        engines = list(messenger.db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'after_cursor_execute', count_member_rows)
+    try:
+        send(client, conv_id, 'measured')
+    finally:
+        for engine in engines:
+            event.remove(engine, 'after_cursor_execute', count_member_rows)
+    assert sum(updated) == 1
@@ -0,0 +1,35 @@
+"""/api/sync deltas come from change log entries written at commit"""
+
+
+def sync(client, since):
+    response = client.get(f'/api/sync?since={since}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_sync_returns_changes_after_the_cursor(make_user):
+    client, _ = make_user()
+    other, other_id = make_user()
+    conv_id = client.post('/api/conversations', json={'title': 'sync', 'members': [other_id]}).get_json()['id']
+    
+    snapshot = sync(client, 0)
+    assert snapshot['full']
+    
+    sent = [
+        other.post(f'/api/conversations/{conv_id}/messages', json={'content': f'message {i}'}).get_json()['id']
+        for i in range(2)
+    ]
+    delta = sync(client, snapshot['seq'])
+    assert not delta['full']
+    assert [message['id'] for message in delta['messages']] == sent
+    assert delta['seq'] > snapshot['seq']
+    assert sync(client, delta['seq'])['messages'] == []
+
+
+def test_rolled_back_changes_are_not_logged(messenger):
+    with messenger.app.app_context():
+        newest = messenger.db.session.query(messenger.db.func.max(messenger.ChangeLog.seq)).scalar()
+        messenger.record_change('conversation', 1)
+        messenger.db.session.rollback()
+        messenger.db.session.commit()
+        assert messenger.db.session.query(messenger.db.func.max(messenger.ChangeLog.seq)).scalar() == newest
@@ -0,0 +1,37 @@
+"""init_db() brings a database created by an older version up to the current models"""
+
+from sqlalchemy import inspect, text
+
+
+def test_upgrade_adds_columns_and_merges_duplicate_reactions(messenger, make_user):
+    client, _ = make_user()
+    conv_id = client.post('/api/conversations', json={'title': 'upgrade'}).get_json()['id']
+    message_id = client.post(f'/api/conversations/{conv_id}/messages', json={'content': 'hi'}).get_json()['id']
+    
+    db = messenger.db
+    with messenger.app.app_context():
+        # What the previous schema looked like: no thumbnail column, no reaction constraint
+        db.session.execute(text('DROP TABLE reaction'))
+        db.session.execute(text(
+            'CREATE TABLE reaction (id INTEGER PRIMARY KEY, message_id INTEGER NOT NULL REFERENCES message (id), '
+            'emoji VARCHAR(10) NOT NULL, count INTEGER)'
+        ))
+        db.session.execute(text('ALTER TABLE message DROP COLUMN thumbnail_url'))
+        db.session.execute(
+            text('INSERT INTO reaction (message_id, emoji, count) VALUES (:id, :emoji, :count)'),
+            [{'id': message_id, 'emoji': 'x', 'count': 2}, {'id': message_id, 'emoji': 'x', 'count': 3}],
+        )
+        db.session.commit()
+        
+        messenger.init_db()
+        messenger.init_db()
+        
+        inspector = inspect(db.engine)
+        assert 'thumbnail_url' in {column['name'] for column in inspector.get_columns('message')}
+        assert 'uq_reaction_message_emoji' in {index['name'] for index in inspector.get_indexes('reaction')}
+        rows = db.session.execute(
+            text('SELECT emoji, count FROM reaction WHERE message_id = :id'), {'id': message_id}
+        ).all()
+        assert [tuple(row) for row in rows] == [('x', 5)]
+    
+    assert client.get(f'/api/conversations/{conv_id}/messages').status_code == 200
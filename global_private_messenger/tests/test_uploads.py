@@ -0,0 +1,85 @@
+"""Blob URLs and the already-stored shortcut only reach users who can see the file"""
+
+import io
+import time
+import hashlib
+
+import pytest
+
+CONTENT = b'%PDF-1.4 shared attachment'
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+def message_in(client, conv_id):
+    response = client.post(f'/api/conversations/{conv_id}/messages', json={'content': 'file'})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def start_upload(client, message_id):
+    return client.post('/api/uploads', json={
+        'message_id': message_id, 'filename': 'doc.pdf', 'size': len(CONTENT), 'sha256': DIGEST
+    })
+
+
+def test_blob_urls_and_shortcut(make_user):
+    owner, _ = make_user()
+    member, member_id = make_user()
+    stranger, _ = make_user()
+    conv_id = owner.post('/api/conversations', json={'title': 'files', 'members': [member_id]}).get_json()['id']
+    stranger_conv = stranger.post('/api/conversations', json={'title': 'mine'}).get_json()['id']
+    
+    response = owner.post(f'/api/messages/{message_in(owner, conv_id)}/file',
+                          data={'file': (io.BytesIO(CONTENT), 'doc.pdf')})
+    assert response.status_code == 200
+    file_url = response.get_json()['file_url']
+    assert file_url.startswith(f'/uploads/{DIGEST}.') and file_url != f'/uploads/{DIGEST}.pdf'
+    assert owner.get(file_url).data == CONTENT
+    
+    # The content alone does not give the URL or the file
+    assert stranger.get(f'/uploads/{DIGEST}.pdf').status_code == 404
+    assert stranger.get(f'/uploads/{DIGEST}.{"0" * 32}.pdf').status_code == 404
+    response = start_upload(stranger, message_in(stranger, stranger_conv))
+    assert response.status_code == 201 and response.get_json()['complete'] is False
+    
+    response = start_upload(member, message_in(member, conv_id))
+    assert response.status_code == 200 and response.get_json()['message']['file_url'] == file_url
+
+
+def test_only_content_addressed_responses_are_immutable(make_user):
+    client, user_id = make_user()
+    conv_id = client.post('/api/conversations', json={'title': 'cache'}).get_json()['id']
+    response = client.post(f'/api/messages/{message_in(client, conv_id)}/file',
+                           data={'file': (io.BytesIO(CONTENT), 'doc.pdf')})
+    file_url = response.get_json()['file_url']
+    assert client.get(file_url).cache_control.immutable
+    
+    # No thumbnail is ever made for a PDF, so this is the fallback to the original
+    fallback = client.get(f'{file_url}?variant=thumb').cache_control
+    assert fallback.no_cache and fallback.max_age == 0 and not fallback.immutable
+    
+    avatar_url = client.post(f'/api/users/{user_id}/avatar',
+                             data={'file': (io.BytesIO(CONTENT), 'avatar.pdf')}).get_json()['avatar_url']
+    response = client.get(avatar_url)
+    assert response.status_code == 200 and not response.cache_control.immutable
+
+
+def test_thumbnail_replaces_the_fallback(make_user):
+    Image = pytest.importorskip('PIL.Image')
+    image = io.BytesIO()
+    Image.new('RGB', (800, 600), 'orange').save(image, 'PNG')
+    
+    client, _ = make_user()
+    conv_id = client.post('/api/conversations', json={'title': 'photos'}).get_json()['id']
+    file_url = client.post(f'/api/messages/{message_in(client, conv_id)}/file',
+                           data={'file': (io.BytesIO(image.getvalue()), 'photo.png')}).get_json()['file_url']
+    
+    # Served uncached as the original until the media pipeline has written the thumbnail
+    deadline = time.monotonic() + 10
+    response = client.get(f'{file_url}?variant=thumb')
+    while response.cache_control.no_cache:
+        assert response.data == image.getvalue()
+        assert time.monotonic() < deadline, 'thumbnail was not generated'
+        time.sleep(0.05)
+        response = client.get(f'{file_url}?variant=thumb')
+    assert response.cache_control.immutable and len(response.data) < len(image.getvalue())
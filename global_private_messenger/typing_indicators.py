@@ -0,0 +1,70 @@
+"""
+Server-side aggregation of typing indicators
+
+Clients send a typing signal on every keystroke. Instead of relaying each
+one, signals are rate-limited per user and conversation, entries expire on
+their own, and each room receives at most one typing_state snapshot per
+broadcast interval, only when its set of typing users actually changed.
+"""
+
+import threading
+import time
+
+
+class TypingAggregator:
+    """Who is typing where, with per-room change tracking"""
+    
+    def __init__(self, ttl=6, min_interval=2):
+        self.ttl = ttl
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._typing = {}       # conv_id -> {user_id: (username, expires_at)}
+        self._last_signal = {}  # (conv_id, user_id) -> time of the last accepted signal
+        self._published = {}    # conv_id -> frozenset of user ids last broadcast
+        self._dirty = set()
+    
+    def typing(self, conv_id, user_id, username):
+        now = time.monotonic()
+        key = (conv_id, user_id)
+        with self._lock:
+            last = self._last_signal.get(key)
+            if last is not None and now - last < self.min_interval:
+                return
+            self._last_signal[key] = now
+            self._typing.setdefault(conv_id, {})[user_id] = (username, now + self.ttl)
+            self._dirty.add(conv_id)
+    
+    def stop(self, conv_id, user_id):
+        with self._lock:
+            self._last_signal.pop((conv_id, user_id), None)
+            users = self._typing.get(conv_id)
+            if users and users.pop(user_id, None):
+                self._dirty.add(conv_id)
+                if not users:
+                    del self._typing[conv_id]
+    
+    def collect(self):
+        """Expire stale entries and return {conv_id: [(user_id, username)]} for changed rooms"""
+        now = time.monotonic()
+        changed = {}
+        with self._lock:
+            for conv_id, users in list(self._typing.items()):
+                for user_id in [u for u, (_, expires_at) in users.items() if expires_at <= now]:
+                    del users[user_id]
+                    self._last_signal.pop((conv_id, user_id), None)
+                    self._dirty.add(conv_id)
+                if not users:
+                    del self._typing[conv_id]
+            
+            for conv_id in self._dirty:
+                users = self._typing.get(conv_id, {})
+                current = frozenset(users)
+                if current == self._published.get(conv_id, frozenset()):
+                    continue
+                if current:
+                    self._published[conv_id] = current
+                else:
+                    self._published.pop(conv_id, None)
+                changed[conv_id] = [(user_id, username) for user_id, (username, _) in sorted(users.items())]
+            self._dirty.clear()
+        return changed
@@ -0,0 +1,176 @@
+"""
+Streaming and resumable file uploads
+
+Request bodies are copied to disk in fixed-size chunks, so memory use does
+not depend on the file size, and size and SHA-256 are computed while the
+bytes stream through. Chunked uploads live under <upload folder>/.partial
+as a .part file plus a small JSON description; the .part file length is
+the authoritative resume offset, so an upload can continue after a dropped
+connection or on another worker.
+"""
+
+import os
+import json
+import time
+import hashlib
+import secrets
+import threading
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A chunked upload request that cannot be applied"""
+    
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def copy_stream(stream, out, hasher, limit=None, chunk_size=CHUNK_SIZE):
+    """Copy stream into out, feeding hasher, and return the number of bytes written"""
+    written = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if limit is not None and written > limit:
+            raise UploadError('Upload exceeds the declared size', status=413)
+        hasher.update(chunk)
+        out.write(chunk)
+
+
+def save_stream(stream, path):
+    """Write stream to path, returning (size, sha256 hex digest)"""
+    hasher = hashlib.sha256()
+    with open(path, 'wb') as out:
+        size = copy_stream(stream, out, hasher)
+    return size, hasher.hexdigest()
+
+
+class ChunkedUploadStore:
+    """Upload sessions assembled from sequential byte ranges"""
+    
+    def __init__(self, root, max_size, stale_after=24 * 3600):
+        self.directory = os.path.join(root, '.partial')
+        self.max_size = max_size
+        self.stale_after = stale_after
+        self._hashers = {}   # upload_id -> (offset, sha256 object) for uploads written by this process
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+    
+    def start(self, owner_id, message_id, filename, size=None):
+        if size is not None and not 0 <= size <= self.max_size:
+            raise UploadError('File too large', status=413)
+        os.makedirs(self.directory, exist_ok=True)
+        self.purge_stale()
+        
+        upload_id = secrets.token_hex(16)
+        meta = {
+            'id': upload_id,
+            'owner_id': owner_id,
+            'message_id': message_id,
+            'filename': filename,
+            'size': size,
+            'created_at': time.time()
+        }
+        open(self._path(upload_id, 'part'), 'wb').close()
+        with open(self._path(upload_id, 'json'), 'w') as f:
+            json.dump(meta, f)
+        return dict(meta, received=0)
+    
+    def get(self, upload_id):
+        """Upload description with its received byte count, or None"""
+        if not (len(upload_id) == 32 and all(c in '0123456789abcdef' for c in upload_id)):
+            return None
+        try:
+            with open(self._path(upload_id, 'json')) as f:
+                meta = json.load(f)
+            meta['received'] = os.path.getsize(self._path(upload_id, 'part'))
+        except (OSError, ValueError):
+            return None
+        return meta
+    
+    def write(self, upload_id, offset, stream):
+        """Append the bytes of stream at offset, which must equal the received count"""
+        with self._upload_lock(upload_id):
+            meta = self.get(upload_id)
+            if meta is None:
+                raise UploadError('Upload not found', status=404)
+            if offset != meta['received']:
+                raise UploadError('Offset does not match received bytes', status=409, received=meta['received'])
+            
+            limit = (meta['size'] if meta['size'] is not None else self.max_size) - offset
+            hasher = self._hasher(upload_id, offset)
+            with open(self._path(upload_id, 'part'), 'ab') as out:
+                try:
+                    written = copy_stream(stream, out, hasher, limit=limit)
+                except UploadError:
+                    out.truncate(offset)
+                    self._hashers.pop(upload_id, None)
+                    raise
+            self._hashers[upload_id] = (offset + written, hasher)
+            return offset + written
+    
+    def finish(self, upload_id):
+        """Close a complete upload, returning (meta, path of the data, size, sha256)"""
+        with self._upload_lock(upload_id):
+            meta = self.get(upload_id)
+            if meta is None:
+                raise UploadError('Upload not found', status=404)
+            received = meta['received']
+            if meta['size'] is not None and received != meta['size']:
+                raise UploadError('Upload is incomplete', status=409, received=received)
+            digest = self._hasher(upload_id, received).hexdigest()
+            self._hashers.pop(upload_id, None)
+            return meta, self._path(upload_id, 'part'), received, digest
+    
+    def discard(self, upload_id):
+        self._hashers.pop(upload_id, None)
+        with self._lock:
+            self._locks.pop(upload_id, None)
+        for ext in ('part', 'json'):
+            try:
+                os.unlink(self._path(upload_id, ext))
+            except OSError:
+                pass
+    
+    def purge_stale(self):
+        """Remove abandoned uploads, at most once an hour"""
+        now = time.time()
+        if now - self._purged_at < 3600:
+            return
+        self._purged_at = now
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.json') and now - os.path.getmtime(path) > self.stale_after:
+                    self.discard(name[:-5])
+            except OSError:
+                pass
+    
+    def _hasher(self, upload_id, offset):
+        """SHA-256 state at offset, rehashing the stored bytes when this process lacks it"""
+        cached = self._hashers.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+        hasher = hashlib.sha256()
+        with open(self._path(upload_id, 'part'), 'rb') as f:
+            remaining = offset
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+        return hasher
+    
+    def _upload_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+    
+    def _path(self, upload_id, ext):
+        return os.path.join(self.directory, f'{upload_id}.{ext}')
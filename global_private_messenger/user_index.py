@@ -0,0 +1,133 @@
+"""
+In-memory user search index
+
+Usernames and display names are kept in sorted key lists for prefix lookups
+and in trigram posting lists for substring lookups. Matches are ranked:
+exact username, username prefix, display name (or display name word)
+prefix, then substring anywhere.
+
+Posting lists are append-only arrays; entries left behind by renames are
+filtered out when candidates are verified against the current names.
+"""
+
+import bisect
+import threading
+from array import array
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class UserSearchIndex:
+    """Ranked prefix and substring search over usernames and display names"""
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._names = {}           # user_id -> (username, display_name), lowercased
+        self._username_keys = []   # sorted (username, user_id)
+        self._display_keys = []    # sorted (display name or one of its words, user_id)
+        self._postings = {}        # trigram -> array of user ids
+        self.max_user_id = 0
+        self.ready = False
+    
+    def build(self, rows):
+        """Replace the index with (id, username, display_name) rows"""
+        names = {}
+        username_keys = []
+        display_keys = []
+        postings = {}
+        for user_id, username, display_name in sorted(rows):
+            entry = self._normalize(username, display_name)
+            names[user_id] = entry
+            username_keys.append((entry[0], user_id))
+            display_keys.extend((key, user_id) for key in self._display_keys_for(entry[1]))
+            for gram in trigrams(entry[0]) | trigrams(entry[1]):
+                postings.setdefault(gram, array('q')).append(user_id)
+        username_keys.sort()
+        display_keys.sort()
+        
+        with self._lock:
+            self._names = names
+            self._username_keys = username_keys
+            self._display_keys = display_keys
+            self._postings = postings
+            self.max_user_id = max(names, default=0)
+            self.ready = True
+    
+    def add(self, user_id, username, display_name):
+        """Insert a user or refresh one whose names changed"""
+        entry = self._normalize(username, display_name)
+        with self._lock:
+            old = self._names.get(user_id)
+            if old == entry:
+                return
+            if old is not None:
+                self._remove_key(self._username_keys, (old[0], user_id))
+                for key in self._display_keys_for(old[1]):
+                    self._remove_key(self._display_keys, (key, user_id))
+            self._names[user_id] = entry
+            bisect.insort(self._username_keys, (entry[0], user_id))
+            for key in self._display_keys_for(entry[1]):
+                bisect.insort(self._display_keys, (key, user_id))
+            old_grams = trigrams(old[0]) | trigrams(old[1]) if old else set()
+            for gram in (trigrams(entry[0]) | trigrams(entry[1])) - old_grams:
+                self._postings.setdefault(gram, array('q')).append(user_id)
+            self.max_user_id = max(self.max_user_id, user_id)
+    
+    def search(self, query, limit=20):
+        """User ids matching query, best matches first"""
+        query = ' '.join(query.lower().split())
+        if not query:
+            return []
+        with self._lock:
+            results = []
+            seen = set()
+            
+            def take(user_ids):
+                for user_id in user_ids:
+                    if len(results) >= limit:
+                        return
+                    if user_id not in seen:
+                        seen.add(user_id)
+                        results.append(user_id)
+            
+            username_prefix = list(self._prefix_matches(self._username_keys, query, limit))
+            take(user_id for key, user_id in username_prefix if key == query)
+            take(user_id for _, user_id in username_prefix)
+            take(user_id for _, user_id in self._prefix_matches(self._display_keys, query, limit))
+            if len(results) < limit and len(query) >= 3:
+                take(self._substring_matches(query))
+            return results
+    
+    def _prefix_matches(self, keys, prefix, limit):
+        index = bisect.bisect_left(keys, (prefix,))
+        for key, user_id in keys[index:index + limit * 2]:
+            if not key.startswith(prefix):
+                return
+            yield key, user_id
+    
+    def _substring_matches(self, query):
+        lists = [self._postings.get(gram) for gram in trigrams(query)]
+        if not all(lists):
+            return
+        # Verify candidates from the shortest posting list against the current names
+        for user_id in min(lists, key=len):
+            names = self._names.get(user_id)
+            if names and (query in names[0] or query in names[1]):
+                yield user_id
+    
+    @staticmethod
+    def _normalize(username, display_name):
+        return (username or '').lower(), ' '.join((display_name or '').lower().split())
+    
+    @staticmethod
+    def _display_keys_for(display_name):
+        words = display_name.split()
+        return {display_name} | set(words) if display_name else set()
+    
+    @staticmethod
+    def _remove_key(keys, key):
+        index = bisect.bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            del keys[index]
@@ -0,0 +1,30 @@
+"""
+Production entry point
+
+    SOCKETIO_ASYNC_MODE=eventlet gunicorn --worker-class eventlet -w 1 wsgi:app
+    SOCKETIO_ASYNC_MODE=gevent gunicorn --worker-class gevent -w 1 wsgi:app
+    SOCKETIO_ASYNC_MODE=threading gunicorn --threads 100 -w 1 wsgi:app
+    python wsgi.py
+
+The async mode comes from SOCKETIO_ASYNC_MODE in config.py. For eventlet and
+gevent the standard library is monkey-patched here, before app.py and its
+dependencies import threading, socket or ssl.
+"""
+
+import os
+
+from config import config
+from async_mode import monkey_patch
+
+app_config = config.get(os.environ.get('FLASK_ENV', 'default'), config['default'])
+monkey_patch(app_config.SOCKETIO_ASYNC_MODE)
+
+from app import app, socketio, init_db, sync_user_index  # noqa: E402  has to follow the patching
+
+with app.app_context():
+    init_db()
+    sync_user_index()
+
+if __name__ == '__main__':
+    socketio.run(app, host=app.config['HOST'], port=app.config['PORT'], debug=False,
+                 allow_unsafe_werkzeug=app.config['SOCKETIO_ASYNC_MODE'] == 'threading')